@@ -1,9 +1,26 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import requests
 from functools import wraps
+from collections import OrderedDict, deque
+import gzip
+import os
+import re
+import threading
+import time
 from server_ipc.voice_assistant_for_server import process_wav_file 
 
+# Codifiche opzionali: usate solo se i relativi pacchetti sono installati
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 app = Flask(__name__)
 CORS(app)  # Abilita CORS per tutte le route
 
@@ -12,6 +29,333 @@ IPC_SERVER_URL = 'http://localhost:5001'
 CROP_SERVER_URL = 'http://localhost:5002'
 GEN_SERVER_URL = 'http://localhost:5003'
 
+# Timeout (secondi) per le richieste di health check verso i server interni
+HEALTH_CHECK_TIMEOUT = 2
+
+# Timeout (secondi) delle richieste inoltrate: connessione e lettura, cioè
+# attesa massima tra due blocchi della risposta. Gli stream SSE e gli upload
+# (parsing del file) possono restare a lungo senza inviare nulla
+FORWARD_CONNECT_TIMEOUT = 3
+FORWARD_READ_TIMEOUT = 120
+FORWARD_STREAM_READ_TIMEOUT = 300
+
+# Health check passivo: dopo MAX_REPLICA_FAILURES errori consecutivi una replica
+# viene esclusa dal bilanciamento per REPLICA_EJECTION_TIME secondi
+MAX_REPLICA_FAILURES = 3
+REPLICA_EJECTION_TIME = 10
+
+# Pool di repliche per un server interno, bilanciato con least-outstanding-requests
+class BackendPool:
+    def __init__(self, urls):
+        self.replicas = [{
+            "url": url,
+            "outstanding": 0,
+            "failures": 0,
+            "ejected_until": 0.0
+        } for url in urls]
+        self.lock = threading.Lock()
+
+    def acquire(self, exclude=()):
+        """Sceglie la replica attiva con meno richieste in corso."""
+        with self.lock:
+            now = time.monotonic()
+            candidates = [r for r in self.replicas if r["url"] not in exclude]
+            available = [r for r in candidates if r["ejected_until"] <= now]
+            # Se tutte le repliche sono escluse si prova comunque, meglio che rifiutare
+            replica = min(available or candidates, key=lambda r: r["outstanding"], default=None)
+            if replica is not None:
+                replica["outstanding"] += 1
+            return replica
+
+    def release(self, replica, success):
+        with self.lock:
+            replica["outstanding"] -= 1
+            if success:
+                replica["failures"] = 0
+                replica["ejected_until"] = 0.0
+            else:
+                replica["failures"] += 1
+                if replica["failures"] >= MAX_REPLICA_FAILURES:
+                    replica["ejected_until"] = time.monotonic() + REPLICA_EJECTION_TIME
+
+    def urls(self):
+        return [r["url"] for r in self.replicas]
+
+# Le URL delle repliche arrivano da start_all.py, separate da virgola
+def pool_from_env(env_var, default_url):
+    urls = [url.strip() for url in os.environ.get(env_var, default_url).split(',') if url.strip()]
+    return BackendPool(urls)
+
+IPC_POOL = pool_from_env('IPC_SERVER_URLS', IPC_SERVER_URL)
+CROP_POOL = pool_from_env('CROP_SERVER_URLS', CROP_SERVER_URL)
+GEN_POOL = pool_from_env('GEN_SERVER_URLS', GEN_SERVER_URL)
+
+BACKEND_POOLS = {
+    "ipc": IPC_POOL,
+    "crop": CROP_POOL,
+    "gen": GEN_POOL,
+}
+
+# Cache in memoria delle risposte GET: i server interni la abilitano con Cache-Control
+CACHE_MAX_BYTES = 64 * 1024 * 1024       # dimensione massima complessiva
+CACHE_MAX_ENTRY_BYTES = 8 * 1024 * 1024  # risposte più grandi non vengono salvate
+CACHE_MAX_TTL = 3600                     # limite superiore per max-age (secondi)
+CACHE_INVALIDATION_LOG = 256             # invalidazioni ricordate per prefisso
+
+# Richieste non GET che non modificano dati: non invalidano la cache
+CACHE_NEUTRAL_ROUTES = {
+    "ipc": [
+        re.compile(r'^/api/(text-assistance|voice-assistance)/\d+(/stream)?$'),
+        re.compile(r'^/api/generate_llm_data/\d+$'),
+    ],
+}
+
+def is_cache_neutral(prefix, path):
+    return any(pattern.match(path) for pattern in CACHE_NEUTRAL_ROUTES.get(prefix, ()))
+
+# Scheda da cui dipende una risposta GET (X-Board-Id), None se non indicata
+def cache_board(headers):
+    value = next((value for name, value in headers.items() if name.lower() == 'x-board-id'), None)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+# Schede modificate da una scrittura (X-Changed-Boards), None se non indicate:
+# in quel caso la scrittura può aver cambiato qualunque cosa
+def changed_boards(headers):
+    value = next((value for name, value in headers.items() if name.lower() == 'x-changed-boards'), None)
+    if value is None:
+        return None
+    try:
+        return frozenset(int(board_id) for board_id in value.split(',') if board_id.strip())
+    except ValueError:
+        return None
+
+# Una risposta della scheda board è toccata da un'invalidazione delle schede
+# boards; le risposte senza scheda lo sono sempre
+def is_affected(board, boards):
+    return boards is None or board is None or board in boards
+
+# Cache LRU con scadenza (TTL) e limite in byte
+class ResponseCache:
+    def __init__(self, max_bytes, max_entry_bytes, max_ttl):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.max_ttl = max_ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        # Contatore per prefisso, incrementato a ogni scrittura: evita di salvare
+        # risposte lette prima di un'invalidazione ma arrivate dopo
+        self.generations = {}
+        # Ultime invalidazioni per prefisso: (generazione, schede o None)
+        self.invalidations = {}
+        self.lock = threading.Lock()
+
+    def generation(self, prefix):
+        with self.lock:
+            return self.generations.get(prefix, 0)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires_at"] <= time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, prefix, generation, content, status_code, headers):
+        max_age = cache_max_age(headers)
+        if status_code != 200 or max_age is None or len(content) > self.max_entry_bytes:
+            return None
+
+        board = cache_board(headers)
+        with self.lock:
+            if self.is_stale(prefix, generation, board):
+                return None
+            if key in self.entries:
+                self._remove(key)
+
+            entry = {
+                "key": key,
+                "prefix": prefix,
+                "board": board,
+                "content": content,
+                "status_code": status_code,
+                "headers": headers,
+                "variants": {},
+                "size": len(content),
+                "expires_at": time.monotonic() + min(max_age, self.max_ttl)
+            }
+            self.entries[key] = entry
+            self.size += entry["size"]
+            self._evict()
+            return entry
+
+    # Variante compressa di una risposta in cache, calcolata una sola volta
+    def variant(self, entry, encoding, compress):
+        with self.lock:
+            data = entry["variants"].get(encoding)
+        if data is not None:
+            return data
+
+        data = compress(entry["content"])
+        with self.lock:
+            if encoding not in entry["variants"] and self.entries.get(entry["key"]) is entry:
+                entry["variants"][encoding] = data
+                entry["size"] += len(data)
+                self.size += len(data)
+                self._evict()
+        return data
+
+    # Rimuove le risposte del prefisso che dipendono dalle schede boards
+    # (tutte quando boards è None)
+    def invalidate(self, prefix, boards=None):
+        with self.lock:
+            generation = self.generations.get(prefix, 0) + 1
+            self.generations[prefix] = generation
+            log = self.invalidations.setdefault(prefix, deque(maxlen=CACHE_INVALIDATION_LOG))
+            log.append((generation, boards))
+            for key in [k for k, entry in self.entries.items()
+                        if entry["prefix"] == prefix and is_affected(entry["board"], boards)]:
+                self._remove(key)
+
+    # Vero se una risposta letta alla generazione indicata è stata superata da
+    # un'invalidazione successiva che la riguarda
+    def is_stale(self, prefix, generation, board):
+        missed = self.generations.get(prefix, 0) - generation
+        if missed == 0:
+            return False
+        later = [boards for number, boards in self.invalidations.get(prefix, ()) if number > generation]
+        # Invalidazioni non più nel registro: la risposta va considerata superata
+        if len(later) < missed:
+            return True
+        return any(is_affected(board, boards) for boards in later)
+
+    def _evict(self):
+        while self.size > self.max_bytes and self.entries:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.size -= entry["size"]
+
+# Restituisce la durata indicata dal server interno, None se la risposta non è cacheabile
+def cache_max_age(headers):
+    cache_control = next((value for name, value in headers.items() if name.lower() == 'cache-control'), '')
+    directives = {}
+    for directive in cache_control.split(','):
+        name, _, value = directive.strip().partition('=')
+        directives[name.lower()] = value
+
+    if 'no-store' in directives or 'no-cache' in directives or 'private' in directives:
+        return None
+    # s-maxage è rivolto alle cache condivise come il gateway e ha la precedenza
+    try:
+        max_age = int(directives.get('s-maxage') or directives.get('max-age', ''))
+    except ValueError:
+        return None
+    return max_age if max_age > 0 else None
+
+RESPONSE_CACHE = ResponseCache(CACHE_MAX_BYTES, CACHE_MAX_ENTRY_BYTES, CACHE_MAX_TTL)
+
+# Compressione delle risposte negoziata tramite Accept-Encoding
+COMPRESSION_MIN_SIZE = 1024  # sotto questa soglia (byte) la compressione non conviene
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/xml', 'application/javascript')
+
+COMPRESSORS = {
+    'gzip': lambda data: gzip.compress(data, compresslevel=6)
+}
+if zstandard is not None:
+    COMPRESSORS['zstd'] = lambda data: zstandard.ZstdCompressor(level=3).compress(data)
+if brotli is not None:
+    COMPRESSORS['br'] = lambda data: brotli.compress(data, quality=5)
+
+# Ordine di preferenza a parità di qualità richiesta dal client
+ENCODING_PREFERENCE = ('zstd', 'br', 'gzip')
+
+# Sceglie la codifica migliore tra quelle accettate dal client e disponibili
+def negotiate_encoding(accept_encoding):
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name] = quality
+
+    best = None
+    for encoding in ENCODING_PREFERENCE:
+        if encoding not in COMPRESSORS:
+            continue
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+# Comprime il corpo della risposta se il client lo accetta e ne vale la pena
+def compress_response(content, status_code, headers, entry=None):
+    content_type = next((value for name, value in headers.items() if name.lower() == 'content-type'), '')
+    if len(content) < COMPRESSION_MIN_SIZE or not content_type.startswith(COMPRESSIBLE_TYPES):
+        return content, status_code, headers
+
+    headers = {**headers, 'Vary': 'Accept-Encoding'}
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding is None:
+        return content, status_code, headers
+
+    compress = COMPRESSORS[encoding]
+    if entry is not None:
+        content = RESPONSE_CACHE.variant(entry, encoding, compress)
+    else:
+        content = compress(content)
+
+    headers['Content-Encoding'] = encoding
+    return content, status_code, headers
+
+# Coalescing delle GET identiche concorrenti (single-flight): la prima richiesta
+# contatta il server interno, le altre attendono e ricevono la stessa risposta
+class SingleFlight:
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"event": threading.Event(), "result": None, "error": None}
+                self.calls[key] = call
+
+        if not leader:
+            call["event"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"], True
+
+        try:
+            call["result"] = fn()
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call["event"].set()
+        return call["result"], False
+
+INFLIGHT_REQUESTS = SingleFlight()
+
 ALLOWED_MACS = {
     "fc:d2:b6:ac:84:ae",
     "8c:8d:28:32:d7:ff",
@@ -31,65 +375,161 @@ def require_mac(f):
         return f(*args, **kwargs)
     return decorated_function
 
-# Funzione di routing generica
-def route_request(server_url, path):
+# Timeout (connessione, lettura) per la richiesta corrente
+def forward_timeout(path):
+    streaming = (request.files or path.endswith('/stream')
+                 or 'text/event-stream' in request.headers.get('Accept', ''))
+    return FORWARD_CONNECT_TIMEOUT, FORWARD_STREAM_READ_TIMEOUT if streaming else FORWARD_READ_TIMEOUT
+
+# Inoltra la richiesta corrente a una replica del server interno
+def forward_request(server_url, path):
     url = f'{server_url}{path}'
-    try:
-        # Gestione speciale per upload di file
-        if request.files:
-            # Per richieste multipart/form-data (upload file)
-            files = {name: (file.filename, file.stream, file.content_type)
-                    for name, file in request.files.items()}
-
-            # Includi anche i dati del form se presenti
-            form_data = request.form.to_dict() if request.form else None
-
-            response = requests.request(
-                method=request.method,
-                url=url,
-                files=files,
-                data=form_data,
-                params=request.args,
-                stream=True
-            )
-        else:
-            # Per richieste normali (JSON, ecc.)
-            headers = {key: value for key, value in request.headers.items()
-                      if key.lower() not in ['host', 'content-length']}
+    timeout = forward_timeout(path)
+
+    # Gestione speciale per upload di file
+    if request.files:
+        # Per richieste multipart/form-data (upload file)
+        files = {name: (file.filename, file.stream, file.content_type)
+                for name, file in request.files.items()}
+
+        # Includi anche i dati del form se presenti
+        form_data = request.form.to_dict() if request.form else None
+
+        return requests.request(
+            method=request.method,
+            url=url,
+            files=files,
+            data=form_data,
+            params=request.args,
+            stream=True,
+            timeout=timeout
+        )
+
+    # Per richieste normali (JSON, ecc.)
+    headers = {key: value for key, value in request.headers.items()
+              if key.lower() not in ['host', 'content-length']}
+
+    return requests.request(
+        method=request.method,
+        url=url,
+        headers=headers,
+        data=request.get_data(),
+        params=request.args,
+        stream=True,
+        timeout=timeout
+    )
 
-            response = requests.request(
-                method=request.method,
-                url=url,
-                headers=headers,
-                data=request.get_data(),
-                params=request.args,
-                stream=True
-            )
+# Header della risposta interna da non ritrasmettere al client
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'content-encoding', 'content-length'}
 
-        return response.content, response.status_code, dict(response.headers)
+# Le risposte server-sent events vanno inoltrate man mano che arrivano
+def is_event_stream(headers):
+    return headers.get('Content-Type', '').startswith('text/event-stream')
 
-    except requests.exceptions.RequestException as e:
-        return jsonify({'error': f'Gateway error: {str(e)}'}), 500, {}
+# Inoltra uno stream SSE senza bufferizzarlo: il corpo è un generatore e la
+# replica resta occupata finché lo stream non è terminato
+def stream_response(pool, replica, response):
+    def relay():
+        success = True
+        try:
+            for chunk in response.iter_content(chunk_size=None):
+                yield chunk
+        except requests.exceptions.RequestException:
+            success = False
+        finally:
+            response.close()
+            pool.release(replica, success=success)
+
+    headers = {key: value for key, value in response.headers.items()
+              if key.lower() not in HOP_BY_HOP_HEADERS}
+    headers['Cache-Control'] = 'no-cache'
+    headers['X-Accel-Buffering'] = 'no'
+    return relay(), response.status_code, headers
+
+# Funzione di routing generica
+def route_request(pool, path):
+    tried = set()
+    error = None
+
+    # Le GET sono idempotenti: se una replica non risponde si riprova sulle altre
+    attempts = len(pool.replicas) if request.method == 'GET' else 1
+
+    for _ in range(attempts):
+        replica = pool.acquire(exclude=tried)
+        if replica is None:
+            break
+        tried.add(replica["url"])
+
+        try:
+            response = forward_request(replica["url"], path)
+            if is_event_stream(response.headers):
+                return stream_response(pool, replica, response)
+            content = response.content
+        except requests.exceptions.RequestException as e:
+            pool.release(replica, success=False)
+            error = e
+            continue
+
+        pool.release(replica, success=response.status_code not in (502, 503, 504))
+
+        # requests decomprime già il corpo: lunghezza e codifica vengono ricalcolate qui
+        headers = {key: value for key, value in response.headers.items()
+                  if key.lower() not in HOP_BY_HOP_HEADERS}
+        return content, response.status_code, headers
+
+    return jsonify({'error': f'Gateway error: {str(error)}'}).get_data(), 500, {'Content-Type': 'application/json'}
+
+# Inoltra la richiesta passando dalla cache: le GET vengono servite dalla cache
+# quando possibile, le scritture invalidano le risposte dello stesso server
+# che dipendono dalle schede modificate
+def cached_route_request(prefix, pool, path):
+    if request.method != 'GET':
+        content, status_code, headers = route_request(pool, path)
+        if not is_cache_neutral(prefix, path):
+            RESPONSE_CACHE.invalidate(prefix, changed_boards(headers))
+        if is_event_stream(headers):
+            # Gli stream non passano né dalla cache né dalla compressione
+            return Response(content, direct_passthrough=True), status_code, headers
+        return compress_response(content, status_code, headers)
+
+    key = (request.method, request.path, tuple(sorted(request.args.items(multi=True))))
+    entry = RESPONSE_CACHE.get(key)
+    if entry is not None:
+        return compress_response(entry["content"], entry["status_code"],
+                                 {**entry["headers"], 'X-Cache': 'HIT'}, entry)
+
+    # Una GET arrivata dopo una scrittura non si accoda a una lettura partita
+    # prima: la generazione fa parte della chiave del single-flight
+    generation = RESPONSE_CACHE.generation(prefix)
+
+    def fetch():
+        content, status_code, headers = route_request(pool, path)
+        entry = RESPONSE_CACHE.put(key, prefix, generation, content, status_code, headers)
+        return content, status_code, headers, entry
+
+    (content, status_code, headers, entry), shared = INFLIGHT_REQUESTS.do((key, generation), fetch)
+    return compress_response(content, status_code,
+                             {**headers, 'X-Cache': 'COALESCED' if shared else 'MISS'}, entry)
 
 # Route per IPC
 @app.route('/ipc/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
 @require_mac
 def ipc_route(path):
-    content, status_code, headers = route_request(IPC_SERVER_URL, f'/api/{path}')
+    content, status_code, headers = cached_route_request('ipc', IPC_POOL, f'/api/{path}')
     return content, status_code, headers
 
 # Route per Crop
 @app.route('/crop/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
 @require_mac
 def crop_route(path):
-    content, status_code, headers = route_request(CROP_SERVER_URL, f'/api/{path}')
+    content, status_code, headers = cached_route_request('crop', CROP_POOL, f'/api/{path}')
     return content, status_code, headers
 
 # Route per Gen
 @app.route('/gen/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
 @require_mac
 def gen_route(path):
-    content, status_code, headers = route_request(GEN_SERVER_URL, f'/api/{path}')
+    content, status_code, headers = cached_route_request('gen', GEN_POOL, f'/api/{path}')
     return content, status_code, headers
 
 # Pagina principale del gateway
@@ -100,10 +540,45 @@ def index():
         "endpoints": {
             "IPC API": "/ipc/...",
             "Crop API": "/crop/...",
-            "Gen API": "/gen/..."
+            "Gen API": "/gen/...",
+            "Health": "/health"
         }
     })
 
+# Health check aggregato dei server interni
+@app.route('/health')
+def health():
+    services = {}
+    for name, pool in BACKEND_POOLS.items():
+        replicas = {}
+        for server_url in pool.urls():
+            try:
+                response = requests.get(f'{server_url}/api/health', timeout=HEALTH_CHECK_TIMEOUT)
+                replicas[server_url] = "healthy" if response.status_code == 200 else "unhealthy"
+            except requests.exceptions.RequestException:
+                replicas[server_url] = "unreachable"
+
+        healthy_count = sum(1 for status in replicas.values() if status == "healthy")
+        if healthy_count == len(replicas):
+            status = "healthy"
+        elif healthy_count:
+            status = "degraded"
+        else:
+            status = "unreachable"
+
+        services[name] = {
+            "status": status,
+            "healthy_replicas": healthy_count,
+            "replicas": replicas
+        }
+
+    # Il gateway è utilizzabile finché ogni servizio ha almeno una replica attiva
+    healthy = all(service["healthy_replicas"] for service in services.values())
+    return jsonify({
+        "status": "healthy" if healthy else "degraded",
+        "services": services
+    }), 200 if healthy else 503
+
 # Gestione errori 404
 @app.errorhandler(404)
 def not_found(e):
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, CheckConstraint, LargeBinary
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, ForeignKey, CheckConstraint, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 
@@ -6,6 +6,14 @@ Base = declarative_base()
 engine = create_engine('sqlite:///crop.db')
 Session = sessionmaker(bind=engine)
 
+# WAL lets the replicas started by start_all.py read concurrently with a writer
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
 # Models defined
 class Board(Base):
     __tablename__ = 'board'
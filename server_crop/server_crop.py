@@ -1,4 +1,5 @@
-from flask import Flask, request, jsonify, render_template_string, send_file, g
+from flask import Flask, request, jsonify, render_template_string, send_file, g, make_response
+from functools import wraps
 import io
 import database_crop
 from database_crop import Session
@@ -11,9 +12,25 @@ if os.environ.get('FLASK_ENV') != 'development':
 
 app = Flask(__name__)
 
+# Porta di ascolto, sovrascritta da start_all.py quando si avviano più repliche
+PORT = int(os.environ.get('PORT', 5002))
+
 # Inizializza il database
 database_crop.init_db()
 
+# Durata massima (secondi) per cui il gateway può tenere in cache le immagini
+CACHE_MAX_AGE = 300
+
+# Rende una GET cacheabile dal gateway tramite Cache-Control
+def cacheable(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        response = make_response(f(*args, **kwargs))
+        if response.status_code == 200:
+            response.headers['Cache-Control'] = f'public, s-maxage={CACHE_MAX_AGE}'
+        return response
+    return decorated_function
+
 # Gestione della sessione
 @app.before_request
 def create_session():
@@ -181,6 +198,7 @@ def get_schematic(schematic_id):
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/schematics/<int:schematic_id>/image', methods=['GET'])
+@cacheable
 def get_schematic_image(schematic_id):
     try:
         image_data = database_crop.get_schematic_image(schematic_id)
@@ -266,6 +284,7 @@ def get_placement(placement_id):
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/placements/<int:placement_id>/image', methods=['GET'])
+@cacheable
 def get_placement_image(placement_id):
     try:
         image_data = database_crop.get_placement_image(placement_id)
@@ -466,6 +485,15 @@ def clear_database():
         g.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+# Health check
+@app.route('/api/health', methods=['GET'])
+def health_check():
+    return jsonify({
+        "status": "healthy",
+        "service": "Crop Server",
+        "port": PORT
+    })
+
 # Avvio del server
 if __name__ == '__main__':
-    app.run(host="127.0.0.1", port=5002, debug=False)
\ No newline at end of file
+    app.run(host="127.0.0.1", port=PORT, debug=False)
\ No newline at end of file
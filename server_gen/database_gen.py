@@ -1,5 +1,5 @@
 # Creo il file database_gen.py
-from sqlalchemy import create_engine, Column, Text, Integer, String, Float, ForeignKey, CheckConstraint, LargeBinary, Enum
+from sqlalchemy import create_engine, event, Column, Text, Integer, String, Float, ForeignKey, CheckConstraint, LargeBinary, Enum
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 import sqlite3
@@ -12,6 +12,14 @@ Base = declarative_base()
 engine = create_engine('sqlite:///gen_server.db')
 Session = sessionmaker(bind=engine)
 
+# WAL lets the replicas started by start_all.py read concurrently with a writer
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
 ####
 # Models defined
 ####
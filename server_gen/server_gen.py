@@ -12,6 +12,9 @@ if os.environ.get('FLASK_ENV') != 'development':
 
 app = Flask(__name__)
 
+# Listening port, overridden by start_all.py when running several replicas
+PORT = int(os.environ.get('PORT', 5003))
+
 # Initialize database
 database_gen.init_db()
 
@@ -277,9 +280,9 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "service": "Gen Server",
-        "port": 5003
+        "port": PORT
     })
 
 # Run the Flask application for server Gen
 if __name__ == '__main__':
-    app.run(host="127.0.0.1", port=5003, debug=False)
\ No newline at end of file
+    app.run(host="127.0.0.1", port=PORT, debug=False)
\ No newline at end of file
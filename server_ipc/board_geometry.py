@@ -0,0 +1,150 @@
+from collections import OrderedDict
+import math
+import threading
+
+import numpy as np
+from sqlalchemy import text
+
+from database_ipc import board_version, engine
+
+################################################################
+# Board coordinates
+################################################################
+
+# Pin.x/y are relative to the package origin. A component places its
+# package at (x, y) rotated counter-clockwise by rotation degrees; on the
+# BOTTOM side the package is seen from below, so once rotated it is
+# mirrored around the board's Y axis (checked against the trace endpoints
+# of BOTTOM parts at 90 and 270 degrees).
+
+# Bumped whenever the placement transform changes, so that ETags of
+# computed positions change with it
+PLACEMENT_VERSION = 2
+
+def is_mirrored(layer):
+    return (layer or '').upper() == 'BOTTOM'
+
+def pin_world_position(x, y, rotation, layer, pin_x, pin_y):
+    """
+    Return the board (world) coordinates of a pin of a component placed at
+    (x, y) with the given rotation and layer.
+    """
+    pin_x = pin_x or 0.0
+    pin_y = pin_y or 0.0
+    angle = math.radians(rotation or 0)
+    cos, sin = math.cos(angle), math.sin(angle)
+    offset_x = pin_x * cos - pin_y * sin
+    if is_mirrored(layer):
+        offset_x = -offset_x
+    return (
+        (x or 0.0) + offset_x,
+        (y or 0.0) + pin_x * sin + pin_y * cos
+    )
+
+def placement_matrices(rotations, mirrored):
+    """
+    Return the (n, 2, 2) matrices mapping package coordinates to board
+    coordinates for n components: a rotation, followed by a mirror around
+    the Y axis for the mirrored ones.
+    """
+    angle = np.radians(rotations)
+    cos, sin = np.cos(angle), np.sin(angle)
+    flip = np.where(mirrored, -1.0, 1.0)
+    return np.stack([
+        np.stack([cos * flip, -sin * flip], axis=-1),
+        np.stack([sin, cos], axis=-1)
+    ], axis=-2)
+
+def transform_pins(offsets, matrices, component_index, local):
+    """
+    Vectorized pin_world_position: local[k] is the package position of pin k,
+    which belongs to component component_index[k] placed at offsets[c] with
+    matrices[c]. Returns the (n, 2) board coordinates.
+    """
+    return np.einsum('kij,kj->ki', matrices[component_index], local) + offsets[component_index]
+
+################################################################
+# World-space pins of a board
+################################################################
+
+# Pin positions kept in memory for the most recently queried boards
+PIN_CACHE_SIZE = 8
+
+class BoardPins:
+    """
+    Board (world) coordinates of every pin of every component of a board,
+    as parallel arrays ordered by component and pin id: pin k is pin
+    pin_ids[k] of component component_ids[k] and lies at xy[k].
+    """
+
+    def __init__(self, uid, revision, components, pins):
+        self.uid = uid
+        self.revision = revision
+
+        component_ids = np.array([row.id for row in components], dtype=np.int32)
+        offsets = np.array([(row.x or 0.0, row.y or 0.0) for row in components], dtype=np.float64).reshape(-1, 2)
+        matrices = placement_matrices(
+            np.array([row.rotation or 0 for row in components], dtype=np.float64),
+            np.array([is_mirrored(row.layer) for row in components], dtype=bool)
+        )
+
+        self.component_ids = np.array([row.component_id for row in pins], dtype=np.int32)
+        self.pin_ids = np.array([row.pin_id for row in pins], dtype=np.int32)
+        local = np.array([(row.x or 0.0, row.y or 0.0) for row in pins], dtype=np.float64).reshape(-1, 2)
+        component_index = np.searchsorted(component_ids, self.component_ids)
+        self.xy = transform_pins(offsets, matrices, component_index, local)
+
+    def __len__(self):
+        return len(self.pin_ids)
+
+    def to_bytes(self):
+        """
+        Pack the pins as little-endian records of
+        (component_id int32, pin_id int32, x float32, y float32).
+        """
+        records = np.empty(len(self), dtype=[('component_id', '<i4'), ('pin_id', '<i4'), ('x', '<f4'), ('y', '<f4')])
+        records['component_id'] = self.component_ids
+        records['pin_id'] = self.pin_ids
+        records['x'] = self.xy[:, 0]
+        records['y'] = self.xy[:, 1]
+        return records.tobytes()
+
+_pin_cache = OrderedDict()  # board_id -> BoardPins
+_pin_cache_lock = threading.Lock()
+
+def load_board_pins(connection, board_id, version):
+    components = connection.execute(text(
+        "SELECT id, x, y, rotation, layer FROM component WHERE board_id = :board_id ORDER BY id"
+    ), {"board_id": board_id}).all()
+    pins = connection.execute(text(
+        "SELECT c.id AS component_id, p.id AS pin_id, p.x, p.y FROM component c "
+        "JOIN pin p ON p.package_id = c.package_id "
+        "WHERE c.board_id = :board_id ORDER BY c.id, p.id"
+    ), {"board_id": board_id}).all()
+    return BoardPins(*version, components, pins)
+
+def get_board_pins(board_id):
+    """
+    Return the world-space pins of a board, or None when the board does not
+    exist. They are computed lazily and again when the board's revision
+    changes or its id now belongs to another board.
+    """
+    with engine.connect() as connection:
+        version = board_version(connection, board_id)
+        if version is None:
+            return None
+
+        with _pin_cache_lock:
+            board_pins = _pin_cache.get(board_id)
+            if board_pins is not None and (board_pins.uid, board_pins.revision) == version:
+                _pin_cache.move_to_end(board_id)
+                return board_pins
+
+        board_pins = load_board_pins(connection, board_id, version)
+
+    with _pin_cache_lock:
+        _pin_cache[board_id] = board_pins
+        _pin_cache.move_to_end(board_id)
+        while len(_pin_cache) > PIN_CACHE_SIZE:
+            _pin_cache.popitem(last=False)
+    return board_pins
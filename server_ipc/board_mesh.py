@@ -0,0 +1,312 @@
+from collections import OrderedDict
+import json
+import math
+import struct
+import threading
+
+import numpy as np
+from sqlalchemy import text
+
+from board_geometry import is_mirrored, placement_matrices
+from database_ipc import board_version, engine
+from geometry_lod import merge_collinear, polygon_points, simplify_geometry
+
+################################################################
+# Triangle meshes of a board for the GPU
+################################################################
+
+# Layout (all integers little-endian):
+#   uint32 header length | header | vertex buffer | index buffer
+# The header is UTF-8 JSON padded with spaces to a multiple of 4 bytes.
+# Vertices are interleaved float32 (x, y, id), id being the logical net of
+# a layer's triangles, the component of a footprint or the board itself;
+# indexes are uint32 and relative to the first vertex of their mesh. Each
+# mesh of the header gives its vertex and index ranges (in elements).
+
+MESH_VERSION = 1
+VERTEX_STRIDE = 3
+
+# Largest distance (mm) between a curve and its tessellation
+MESH_TOLERANCE = 0.005
+# Width given to lines drawn with a zero lineWidth
+HAIRLINE_WIDTH = 0.01
+
+# Meshes kept in memory for the most recently queried boards
+MESH_CACHE_SIZE = 4
+
+class MeshBuilder:
+    """Accumulates the triangles of one mesh."""
+
+    def __init__(self):
+        self.vertices = []  # flat x, y, id
+        self.indices = []
+
+    def __len__(self):
+        return len(self.vertices) // VERTEX_STRIDE
+
+    def add(self, points, triangles, object_id):
+        base = len(self)
+        for x, y in points:
+            self.vertices.extend((x, y, object_id))
+        self.indices.extend(base + i for triangle in triangles for i in triangle)
+
+    def disc(self, center, radius, object_id, tolerance=MESH_TOLERANCE):
+        if radius <= 0:
+            return
+        step = 2 * math.acos(max(-1.0, 1 - tolerance / radius)) if tolerance < radius else math.pi / 2
+        segments = max(8, math.ceil(2 * math.pi / step))
+        rim = [
+            (center[0] + radius * math.cos(2 * math.pi * i / segments),
+             center[1] + radius * math.sin(2 * math.pi * i / segments))
+            for i in range(segments)
+        ]
+        self.add([center] + rim, [(0, 1 + i, 1 + (i + 1) % segments) for i in range(segments)], object_id)
+
+    def stroke(self, points, width, line_end, object_id):
+        """
+        A polyline of the given width: one quad per segment, discs at the
+        joins, and round or square ends as line_end asks.
+        """
+        half = max(width or 0.0, HAIRLINE_WIDTH) / 2
+        points = [tuple(point) for point in points]
+        if len(points) == 1:
+            points = points * 2
+        square = (line_end or '').upper() == 'SQUARE'
+        last = len(points) - 2
+        for i, (a, b) in enumerate(zip(points, points[1:])):
+            dx, dy = b[0] - a[0], b[1] - a[1]
+            length = math.hypot(dx, dy)
+            if length == 0:
+                continue
+            ux, uy = dx / length, dy / length
+            if square:
+                if i == 0:
+                    a = (a[0] - ux * half, a[1] - uy * half)
+                if i == last:
+                    b = (b[0] + ux * half, b[1] + uy * half)
+            nx, ny = -uy * half, ux * half
+            self.add(
+                [(a[0] + nx, a[1] + ny), (a[0] - nx, a[1] - ny), (b[0] - nx, b[1] - ny), (b[0] + nx, b[1] + ny)],
+                [(0, 1, 2), (0, 2, 3)],
+                object_id
+            )
+
+        joins = points[1:-1]
+        if (line_end or 'ROUND').upper() == 'ROUND':
+            joins = points if points[0] != points[-1] or len(points) == 2 else points[:-1]
+        for point in joins:
+            self.disc(point, half, object_id)
+
+    def polygon(self, points, object_id):
+        outline = _ring(points)
+        if len(outline) >= 3:
+            self.add(outline, triangulate(outline), object_id)
+
+def _ring(points):
+    ring = merge_collinear([tuple(point) for point in points])
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring.pop()
+    return ring
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+def triangulate(outline):
+    """
+    Ear-clipping triangulation of a simple polygon, returned as index
+    triples into outline.
+    """
+    remaining = list(range(len(outline)))
+    area = sum(_cross((0.0, 0.0), outline[i], outline[i - 1]) for i in range(len(outline)))
+    if area > 0:  # clockwise: walk it counter-clockwise
+        remaining.reverse()
+
+    triangles = []
+    k = 0
+    while len(remaining) > 3:
+        count = len(remaining)
+        # Only reflex corners can lie inside an ear
+        reflex = [
+            outline[remaining[m]] for m in range(count)
+            if _cross(outline[remaining[m - 1]], outline[remaining[m]], outline[remaining[(m + 1) % count]]) <= 0
+        ]
+        # Resume where the last ear was clipped
+        k %= count
+        for _ in range(count):
+            a, b, c = outline[remaining[k - 1]], outline[remaining[k]], outline[remaining[(k + 1) % count]]
+            # Skip reflex or degenerate corners and ears holding a reflex corner
+            if _cross(a, b, c) <= 0 or any(
+                p not in (a, b, c) and _cross(a, b, p) >= 0 and _cross(b, c, p) >= 0 and _cross(c, a, p) >= 0
+                for p in reflex
+            ):
+                k = (k + 1) % count
+                continue
+            triangles.append((remaining[k - 1], remaining[k], remaining[(k + 1) % count]))
+            del remaining[k]
+            k = max(k - 1, 0)
+            break
+        else:
+            # Self-intersecting outline: clip a convex corner anyway, and
+            # fan the rest once only degenerate corners are left
+            k = next((
+                m for m in range(count)
+                if _cross(outline[remaining[m - 1]], outline[remaining[m]], outline[remaining[(m + 1) % count]]) > 0
+            ), None)
+            if k is None:
+                triangles.extend((remaining[0], remaining[m], remaining[m + 1]) for m in range(1, count - 1))
+                return triangles
+            triangles.append((remaining[k - 1], remaining[k], remaining[(k + 1) % count]))
+            del remaining[k]
+    # The last corner of a self-intersecting outline may be a backward spike
+    if len(remaining) == 3 and _cross(*(outline[i] for i in remaining)) > 0:
+        triangles.append(tuple(remaining))
+    return triangles
+
+def _features(geometry_json):
+    try:
+        return json.loads(geometry_json) if geometry_json else []
+    except ValueError as e:
+        print(f"Invalid geometry: {str(e)}")
+        return []
+
+def add_features(mesh, features, object_id):
+    for feature in simplify_geometry(features, MESH_TOLERANCE):
+        kind = feature.get('type')
+        if kind == 'Polyline':
+            mesh.stroke(feature['points'], feature.get('lineWidth'), feature.get('lineEnd'), object_id)
+        elif kind == 'Polygon':
+            mesh.polygon([(point['x'], point['y']) for point in feature['points']], object_id)
+        elif kind == 'Circle':
+            mesh.disc((feature.get('centerX', 0.0), feature.get('centerY', 0.0)), feature.get('diameter', 0.0) / 2, object_id)
+
+def build_board_mesh(connection, board_id):
+    """
+    Return ((uid, revision), mesh bytes) for a board, or None when it does
+    not exist: the board outline, the net designs of each layer and the
+    package footprints of the components of each side.
+    """
+    board = connection.execute(
+        text("SELECT id, polygon, uid, revision FROM board WHERE id = :board_id"), {"board_id": board_id}
+    ).first()
+    if board is None:
+        return None
+
+    meshes = []
+
+    outline = MeshBuilder()
+    outline.polygon(polygon_points(_features(board.polygon), MESH_TOLERANCE), board.id)
+    meshes.append(({"kind": "board"}, outline))
+
+    layers = connection.execute(text(
+        "SELECT id, name, side FROM layer WHERE board_id = :board_id ORDER BY stack_order, id"
+    ), {"board_id": board_id}).all()
+    designs = {}
+    for layer_id, logical_net_id, geometry_json in connection.execute(text(
+        "SELECT nd.layer_id, nd.logical_net_id, nd.geometry_json FROM net_design nd "
+        "JOIN logical_net ln ON nd.logical_net_id = ln.id "
+        "WHERE ln.board_id = :board_id ORDER BY nd.id"
+    ), {"board_id": board_id}):
+        designs.setdefault(layer_id, []).append((logical_net_id, geometry_json))
+    for layer in layers:
+        mesh = MeshBuilder()
+        for logical_net_id, geometry_json in designs.get(layer.id, ()):
+            add_features(mesh, _features(geometry_json), logical_net_id)
+        meshes.append(({"kind": "layer", "layer_id": layer.id, "layer_name": layer.name, "side": layer.side}, mesh))
+
+    components = connection.execute(text(
+        "SELECT c.id, c.layer, c.rotation, c.x, c.y, p.polygon FROM component c "
+        "JOIN package p ON c.package_id = p.id "
+        "WHERE c.board_id = :board_id ORDER BY c.id"
+    ), {"board_id": board_id}).all()
+    footprints = {}  # polygon json -> package outline
+    sides = {"TOP": MeshBuilder(), "BOTTOM": MeshBuilder()}
+    matrices = placement_matrices(
+        np.array([row.rotation or 0 for row in components], dtype=np.float64),
+        np.array([is_mirrored(row.layer) for row in components], dtype=bool)
+    )
+    for row, matrix in zip(components, matrices):
+        if row.polygon not in footprints:
+            ring = _ring(polygon_points(_features(row.polygon), MESH_TOLERANCE))
+            footprints[row.polygon] = (np.array(ring, dtype=np.float64).reshape(-1, 2), triangulate(ring) if len(ring) >= 3 else [])
+        local, triangles = footprints[row.polygon]
+        if not triangles:
+            continue
+        # A mirrored footprint turns clockwise: flip its triangles back
+        if is_mirrored(row.layer):
+            triangles = [(a, c, b) for a, b, c in triangles]
+        world = local @ matrix.T + (row.x or 0.0, row.y or 0.0)
+        sides["BOTTOM" if is_mirrored(row.layer) else "TOP"].add(world.tolist(), triangles, row.id)
+    for side, mesh in sides.items():
+        meshes.append(({"kind": "components", "side": side}, mesh))
+
+    return (board.uid, board.revision), encode_meshes(board.id, board.revision, meshes)
+
+def encode_meshes(board_id, revision, meshes):
+    vertices = []
+    indices = []
+    header_meshes = []
+    vertex_count = index_count = 0
+    for info, mesh in meshes:
+        header_meshes.append({
+            **info,
+            "vertex_offset": vertex_count,
+            "vertex_count": len(mesh),
+            "index_offset": index_count,
+            "index_count": len(mesh.indices)
+        })
+        vertices.append(np.array(mesh.vertices, dtype='<f4'))
+        indices.append(np.array(mesh.indices, dtype='<u4'))
+        vertex_count += len(mesh)
+        index_count += len(mesh.indices)
+
+    header = json.dumps({
+        "version": MESH_VERSION,
+        "board_id": board_id,
+        "revision": revision,
+        "vertex_attributes": [
+            {"name": "position", "type": "float32", "components": 2, "offset": 0},
+            {"name": "id", "type": "float32", "components": 1, "offset": 8}
+        ],
+        "vertex_stride": VERTEX_STRIDE * 4,
+        "index_type": "uint32",
+        "vertex_count": vertex_count,
+        "index_count": index_count,
+        "meshes": header_meshes
+    }, separators=(',', ':')).encode('utf-8')
+    header += b' ' * (-len(header) % 4)
+    return b''.join(
+        [struct.pack('<I', len(header)), header]
+        + [array.tobytes() for array in vertices]
+        + [array.tobytes() for array in indices]
+    )
+
+_mesh_cache = OrderedDict()  # board_id -> ((uid, revision), mesh bytes)
+_mesh_cache_lock = threading.Lock()
+
+def get_board_mesh(board_id):
+    """
+    Return ((uid, revision), mesh bytes) for a board, or None when the board
+    does not exist. Meshes are built lazily and again when the board's
+    revision changes or its id now belongs to another board.
+    """
+    with engine.connect() as connection:
+        version = board_version(connection, board_id)
+        if version is None:
+            return None
+
+        with _mesh_cache_lock:
+            mesh = _mesh_cache.get(board_id)
+            if mesh is not None and mesh[0] == version:
+                _mesh_cache.move_to_end(board_id)
+                return mesh
+
+        mesh = build_board_mesh(connection, board_id)
+        if mesh is None:
+            return None
+
+    with _mesh_cache_lock:
+        _mesh_cache[board_id] = mesh
+        _mesh_cache.move_to_end(board_id)
+        while len(_mesh_cache) > MESH_CACHE_SIZE:
+            _mesh_cache.popitem(last=False)
+    return mesh
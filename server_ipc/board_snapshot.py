@@ -0,0 +1,249 @@
+from collections import defaultdict
+import glob
+import json
+import os
+import struct
+import threading
+
+import numpy as np
+from sqlalchemy import text
+
+from database_ipc import board_version, engine
+
+################################################################
+# Binary snapshot of a whole board
+################################################################
+
+# Layout (all integers little-endian):
+#   b'ARBS' | uint32 format version | uint32 manifest length | manifest | body
+# The manifest is UTF-8 JSON padded with spaces to a multiple of 8 bytes.
+# It carries the board's id, uid, name, polygon and revision, and describes
+# every table of the body column by column: rows, and for each column its
+# dtype and byte offset from the start of the body. Null integers are -1,
+# null floats NaN. Columns marked "strings" hold int32 indexes (-1 for
+# null) into the string table, whose uint32 "offsets" column delimits
+# string i as data[offsets[i]:offsets[i + 1]] (UTF-8).
+
+SNAPSHOT_MAGIC = b'ARBS'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FOLDER = 'snapshots'
+
+# Attempts at reading a board that keeps changing during the read
+SNAPSHOT_READ_ATTEMPTS = 3
+
+INT = '<i4'
+FLOAT = '<f4'
+STRING = 'str'
+
+# table -> (query, [(column, type)]); the query selects the columns in order
+SNAPSHOT_TABLES = {
+    "layers": (
+        "SELECT id, name, layer_function, side, polarity, stack_order FROM layer "
+        "WHERE board_id = :board_id ORDER BY id",
+        [("id", INT), ("name", STRING), ("layer_function", STRING), ("side", STRING),
+         ("polarity", STRING), ("stack_order", INT)]
+    ),
+    "packages": (
+        "SELECT id, name, height, polygon FROM package WHERE id IN "
+        "(SELECT package_id FROM component WHERE board_id = :board_id) ORDER BY id",
+        [("id", INT), ("name", STRING), ("height", FLOAT), ("polygon", STRING)]
+    ),
+    "pins": (
+        "SELECT id, package_id, name, x, y FROM pin WHERE package_id IN "
+        "(SELECT package_id FROM component WHERE board_id = :board_id) ORDER BY id",
+        [("id", INT), ("package_id", INT), ("name", STRING), ("x", FLOAT), ("y", FLOAT)]
+    ),
+    "components": (
+        "SELECT id, package_id, name, part, layer, rotation, x, y FROM component "
+        "WHERE board_id = :board_id ORDER BY id",
+        [("id", INT), ("package_id", INT), ("name", STRING), ("part", STRING), ("layer", STRING),
+         ("rotation", FLOAT), ("x", FLOAT), ("y", FLOAT)]
+    ),
+    "logical_nets": (
+        "SELECT id, name FROM logical_net WHERE board_id = :board_id ORDER BY id",
+        [("id", INT), ("name", STRING)]
+    ),
+    "net_pins": (
+        "SELECT np.id, np.logical_net_id, np.component_id, np.pin_id FROM net_pin np "
+        "JOIN logical_net ln ON np.logical_net_id = ln.id "
+        "WHERE ln.board_id = :board_id ORDER BY np.id",
+        [("id", INT), ("logical_net_id", INT), ("component_id", INT), ("pin_id", INT)]
+    ),
+    "net_designs": (
+        "SELECT nd.id, nd.logical_net_id, nd.layer_id, nd.geometry_json FROM net_design nd "
+        "JOIN logical_net ln ON nd.logical_net_id = ln.id "
+        "WHERE ln.board_id = :board_id ORDER BY nd.id",
+        [("id", INT), ("logical_net_id", INT), ("layer_id", INT), ("geometry_json", STRING)]
+    ),
+}
+
+class StringTable:
+    """Interns strings and hands out their index in the table."""
+
+    def __init__(self):
+        self.index = {}
+
+    def add(self, value):
+        if value is None:
+            return -1
+        value = str(value)
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.index)
+        return i
+
+    def columns(self):
+        data = [value.encode('utf-8') for value in self.index]
+        offsets = np.zeros(len(data) + 1, dtype='<u4')
+        np.cumsum([len(value) for value in data], out=offsets[1:])
+        return offsets, b''.join(data)
+
+class _Body:
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def append(self, data):
+        """Append data aligned to 8 bytes and return its offset."""
+        padding = -self.size % 8
+        if padding:
+            self.chunks.append(b'\0' * padding)
+            self.size += padding
+        offset = self.size
+        self.chunks.append(data)
+        self.size += len(data)
+        return offset
+
+def _column(rows, position, column_type, strings):
+    if column_type == STRING:
+        return np.array([strings.add(row[position]) for row in rows], dtype=INT)
+    if column_type == FLOAT:
+        return np.array([float('nan') if row[position] is None else row[position] for row in rows], dtype=FLOAT)
+    return np.array([-1 if row[position] is None else row[position] for row in rows], dtype=INT)
+
+def encode_snapshot(board, tables):
+    """
+    Encode a board row (id, uid, name, polygon, revision) and {table: rows}
+    following SNAPSHOT_TABLES into the snapshot format.
+    """
+    strings = StringTable()
+    body = _Body()
+    manifest_tables = {}
+    for table, (_, columns) in SNAPSHOT_TABLES.items():
+        rows = tables[table]
+        manifest_columns = {}
+        for position, (column, column_type) in enumerate(columns):
+            values = _column(rows, position, column_type, strings)
+            manifest_columns[column] = {
+                "type": values.dtype.str,
+                "offset": body.append(values.tobytes()),
+                **({"strings": True} if column_type == STRING else {})
+            }
+        manifest_tables[table] = {"rows": len(rows), "columns": manifest_columns}
+
+    offsets, data = strings.columns()
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "board": {
+            "id": board.id, "uid": board.uid, "name": board.name, "polygon": board.polygon, "revision": board.revision
+        },
+        "strings": {
+            "count": len(offsets) - 1,
+            "offsets": body.append(offsets.tobytes()),
+            "data": body.append(data),
+            "length": len(data)
+        },
+        "tables": manifest_tables
+    }
+    manifest = json.dumps(manifest, separators=(',', ':')).encode('utf-8')
+    manifest += b' ' * (-(len(SNAPSHOT_MAGIC) + 8 + len(manifest)) % 8)
+    header = SNAPSHOT_MAGIC + struct.pack('<II', SNAPSHOT_VERSION, len(manifest))
+    return b''.join([header, manifest] + body.chunks)
+
+def _board_row(connection, board_id):
+    return connection.execute(
+        text("SELECT id, uid, name, polygon, revision FROM board WHERE id = :board_id"), {"board_id": board_id}
+    ).first()
+
+def build_snapshot(board_id):
+    """
+    Return ((uid, revision), snapshot bytes) for a board, or None when the
+    board does not exist. The board is read again when its revision changes
+    during the read, so the tables always match the returned revision.
+    """
+    with engine.connect() as connection:
+        board = _board_row(connection, board_id)
+        for _ in range(SNAPSHOT_READ_ATTEMPTS):
+            if board is None:
+                return None
+            tables = {
+                table: connection.execute(text(query), {"board_id": board_id}).all()
+                for table, (query, _) in SNAPSHOT_TABLES.items()
+            }
+            current = _board_row(connection, board_id)
+            if current == board:
+                break
+            board = current
+        else:
+            raise RuntimeError(f"Board {board_id} kept changing while building its snapshot")
+    return (board.uid, board.revision), encode_snapshot(board, tables)
+
+# The uid tells apart boards that got the same id, whose revisions restart
+def snapshot_path(board_id, version):
+    uid, revision = version
+    return os.path.join(SNAPSHOT_FOLDER, f"board_{board_id}_{uid}_r{revision}_v{SNAPSHOT_VERSION}.arbs")
+
+def snapshot_etag(board_id, version):
+    uid, revision = version
+    return f"snapshot-{board_id}-{uid}-r{revision}-v{SNAPSHOT_VERSION}"
+
+_build_locks = defaultdict(threading.Lock)  # board_id -> lock
+_build_locks_lock = threading.Lock()
+
+def get_snapshot(board_id):
+    """
+    Return ((uid, revision), path of the snapshot file) for a board, or
+    None when the board does not exist. Snapshots are built once per board
+    version and kept on disk; older versions of the board are removed.
+    """
+    with engine.connect() as connection:
+        version = board_version(connection, board_id)
+    if version is None:
+        return None
+    path = snapshot_path(board_id, version)
+    if os.path.exists(path):
+        return version, path
+
+    with _build_locks_lock:
+        lock = _build_locks[board_id]
+    with lock:
+        if os.path.exists(path):
+            return version, path
+
+        snapshot = build_snapshot(board_id)
+        if snapshot is None:
+            return None
+        version, data = snapshot
+        path = snapshot_path(board_id, version)
+
+        os.makedirs(SNAPSHOT_FOLDER, exist_ok=True)
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+        discard_snapshots(board_id, keep=path)
+    return version, path
+
+def discard_snapshots(board_id=None, keep=None):
+    """
+    Remove the snapshot files of a board (of every board when board_id is
+    None), except keep.
+    """
+    pattern = f"board_{board_id}_*.arbs" if board_id is not None else "board_*.arbs"
+    for path in glob.glob(os.path.join(SNAPSHOT_FOLDER, pattern)):
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Error removing snapshot {path}: {e}")
@@ -1,7 +1,15 @@
-from sqlalchemy import create_engine, Column, Text, Integer, String, Float, ForeignKey, CheckConstraint, LargeBinary, Enum
+from sqlalchemy import create_engine, event, inspect, text, select, insert, literal, true, false, func, distinct, Column, Text, Integer, String, Float, Boolean, ForeignKey, CheckConstraint, LargeBinary, Enum, Index
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
-import sqlite3
+from PyPDF2 import PdfReader
+from geometry_lod import LOD_TOLERANCES, simplify_geometry, vertex_count
+import io
+import json
+import re
+import time
+import uuid
+from itertools import groupby
 
 ################################################################
 # Database setup
@@ -11,6 +19,14 @@ Base = declarative_base()
 engine = create_engine('sqlite:///arboard.db')
 Session = sessionmaker(bind=engine)
 
+# WAL lets the replicas started by start_all.py read concurrently with a writer
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
 
 ################################################################
 # Models defined
@@ -21,6 +37,13 @@ class Board(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False, unique=True)
     polygon = Column(Text)
+    # Bumped by every change to the board, its packages, pins, components,
+    # nets, net pins, layers and net designs
+    revision = Column(Integer, nullable=False, default=0, server_default="0")
+    # Identity of the board row: ids are reused once the last board is
+    # deleted, so caches keyed by board id also compare uid. Null for boards
+    # created before the column existed
+    uid = Column(String, default=lambda: uuid.uuid4().hex)
 
     components = relationship("Component", back_populates="board")
     logical_nets = relationship("LogicalNet", back_populates="board")
@@ -67,7 +90,7 @@ class LogicalNet(Base):
     __tablename__ = 'logical_net'
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
-    board_id = Column(Integer, ForeignKey('board.id'))
+    board_id = Column(Integer, ForeignKey('board.id'), index=True)
 
     board = relationship("Board", back_populates="logical_nets")
     pin_connections = relationship("NetPin", back_populates="logical_net")
@@ -78,7 +101,7 @@ class NetPin(Base):
     id = Column(Integer, primary_key=True)
     pin_id = Column(Integer, ForeignKey('pin.id'))
     component_id = Column(Integer, ForeignKey('component.id'))
-    logical_net_id = Column(Integer, ForeignKey('logical_net.id'))
+    logical_net_id = Column(Integer, ForeignKey('logical_net.id'), index=True)
 
     pin = relationship("Pin", back_populates="net_connections")
     component = relationship("Component", back_populates="net_connections")
@@ -107,6 +130,14 @@ class NetDesign(Base):
     logical_net = relationship("LogicalNet", back_populates="designs")
     layer = relationship("Layer", back_populates="net_designs")
 
+class NetDesignLod(Base):
+    __tablename__ = 'net_design_lod'
+    # Simplified geometry of a net design, one row per level of detail
+    net_design_id = Column(Integer, ForeignKey('net_design.id'), primary_key=True)
+    level = Column(Integer, primary_key=True)
+    geometry_json = Column(Text, nullable=False)
+    vertex_count = Column(Integer, nullable=False)
+
 class InfoTxt(Base):
     __tablename__ = 'info_txt'
     id = Column(Integer, primary_key=True)
@@ -128,12 +159,113 @@ class UserManual(Base):
     id = Column(Integer, primary_key=True)
     board_id = Column(Integer, ForeignKey('board.id'))
     file_pdf = Column(LargeBinary)
+    # Set once page extraction ran, even when it found no page
+    pages_extracted = Column(Boolean, nullable=False, default=False, server_default="0")
     
     board = relationship("Board")
+    pages = relationship("UserManualPage", back_populates="user_manual")
+
+class UserManualPage(Base):
+    __tablename__ = 'user_manual_page'
+    # AUTOINCREMENT keeps ids unique across re-extractions, so readers can
+    # detect that a manual changed from its page ids alone
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = Column(Integer, primary_key=True)
+    user_manual_id = Column(Integer, ForeignKey('user_manual.id'), nullable=False, index=True)
+    page_number = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+
+    user_manual = relationship("UserManual", back_populates="pages")
+
+class LlmArtifact(Base):
+    __tablename__ = 'llm_artifact'
+    # Info text generated for the assistant, one per board and kind
+    board_id = Column(Integer, ForeignKey('board.id'), primary_key=True)
+    kind = Column(String, primary_key=True)
+    info_txt_id = Column(Integer, ForeignKey('info_txt.id'), nullable=False)
+    revision = Column(Integer, nullable=False)
+
+    board = relationship("Board")
+    info_txt = relationship("InfoTxt")
+
+class LlmDataJob(Base):
+    __tablename__ = 'llm_data_job'
+    # Last background generation of a board's LLM data, visible to every replica
+    board_id = Column(Integer, ForeignKey('board.id'), primary_key=True)
+    status = Column(String, nullable=False)  # "running", "done" or "failed"
+    started_at = Column(Float, nullable=False)  # time.time() of the start
+    result = Column(Text)  # JSON of the response once done or failed
+
+    board = relationship("Board")
+
+class AssistantContext(Base):
+    __tablename__ = 'assistant_context'
+    # One row per board and section, rebuilt when marked stale
+    board_id = Column(Integer, ForeignKey('board.id'), primary_key=True)
+    section = Column(String, primary_key=True)
+    content = Column(Text, nullable=False, default="")
+    stale = Column(Boolean, nullable=False, default=False)
+
+    board = relationship("Board")
+
+class ChangeLog(Base):
+    __tablename__ = 'change_log'
+    # One row per row inserted, updated or deleted on a board, tagged with
+    # the board revision the change produced
+    id = Column(Integer, primary_key=True)
+    board_id = Column(Integer, ForeignKey('board.id'), nullable=False)
+    revision = Column(Integer, nullable=False)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    operation = Column(String, nullable=False)  # insert, update or delete
+
+    __table_args__ = (Index('ix_change_log_board_id_revision', 'board_id', 'revision'),)
 
 # Database init
 def init_db():
     Base.metadata.create_all(engine)
+    enable_incremental_vacuum()
+    add_missing_columns()
+    create_missing_indexes()
+    backfill_user_manual_pages()
+    init_assistant_index()
+    prune_change_log()
+
+# auto_vacuum only takes effect on an existing database after a VACUUM:
+# switch databases created without it once, so that ?vacuum=incremental
+# can free pages later
+def enable_incremental_vacuum():
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+            return
+        try:
+            conn.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+            conn.execute(text("VACUUM"))
+        except Exception as e:
+            # Another replica holds the database: the next start retries
+            print(f"Error enabling incremental vacuum: {e}")
+
+# create_all only creates new tables: add the columns declared later to
+# databases created before them (they must be nullable or have a server default)
+def add_missing_columns():
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+                conn.execute(text(ddl))
+
+# create_all only indexes new tables: add the indexes declared later to
+# databases created before them
+def create_missing_indexes():
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
 
 
 ################################################################
@@ -146,6 +278,17 @@ def get_all_boards(session):
 def get_board(session, board_id):
     return session.query(Board).filter_by(id=board_id).first()
 
+def board_version(connection, board_id):
+    """
+    Return (uid, revision) of a board, or None when it does not exist. A
+    cached value of a board is current when its version matches: the uid
+    tells apart boards that got the same id, the revision follows changes.
+    """
+    row = connection.execute(
+        text("SELECT uid, revision FROM board WHERE id = :board_id"), {"board_id": board_id}
+    ).first()
+    return tuple(row) if row is not None else None
+
 def create_board(session, name, polygon):
     board = Board(name=name, polygon=polygon)
     session.add(board)
@@ -162,6 +305,7 @@ def update_board(session, board_id, name=None, polygon=None):
     if polygon is not None:
         board.polygon = polygon
 
+    board_changed(session, [board_id], [(Board, [board_id], "update")])
     session.commit()
     return True
 
@@ -192,6 +336,8 @@ def delete_board(session, board_id):
         if user_manuals > 0:
             return False, "Cannot delete board: there are user manuals associated with it"
 
+        session.query(ChangeLog).filter_by(board_id=board_id).delete(synchronize_session=False)
+        session.query(LlmDataJob).filter_by(board_id=board_id).delete(synchronize_session=False)
         session.delete(board)
         session.commit()
         return True, f"Board {board_id} deleted successfully"
@@ -200,33 +346,69 @@ def delete_board(session, board_id):
         session.rollback()
         return False, f"Error during delete: {str(e)}"
 
+def board_changed(session, board_ids, changes, *sections):
+    """
+    Record a change to the content of the given boards (a list of ids or a
+    subquery): bump their revision, log the changed rows and mark the listed
+    sections of their assistant context stale. changes lists
+    (model, ids, operation) tuples, ids being a list or a subquery of row
+    ids and operation 'insert', 'update' or 'delete'; deletes must be
+    recorded before the rows are gone. Runs inside the caller's transaction.
+    """
+    if isinstance(board_ids, list):
+        board_ids = [board_id for board_id in board_ids if board_id is not None]
+    else:
+        board_ids = [board_id for board_id in session.scalars(board_ids) if board_id is not None]
+    if not board_ids:
+        return
+    # Boards changed by the session's transaction, reported to the gateway
+    # so that it only drops their cached responses
+    session.info.setdefault("changed_boards", set()).update(board_ids)
+    session.query(Board).filter(Board.id.in_(board_ids)).update(
+        {Board.revision: Board.revision + 1}, synchronize_session=False
+    )
+    log_changes(session, board_ids, changes)
+    if sections:
+        mark_assistant_context_stale(session, board_ids, *sections)
+
 def deep_delete_board(session, board_id):
     try:
         board = session.query(Board).filter_by(id=board_id).first()
         if not board:
             return False, "Board not found"
 
-        components = session.query(Component).filter_by(board_id=board_id).all()
-        component_ids = [comp.id for comp in components]
-        
-        if component_ids:
-            session.query(NetPin).filter(NetPin.component_id.in_(component_ids)).delete(synchronize_session=False)
-
-        logical_nets = session.query(LogicalNet).filter_by(board_id=board_id).all()
-        logical_net_ids = [net.id for net in logical_nets]
-        
-        if logical_net_ids:
-            session.query(NetPin).filter(NetPin.logical_net_id.in_(logical_net_ids)).delete(synchronize_session=False)
-
-        session.query(Component).filter_by(board_id=board_id).delete()
-
-        session.query(LogicalNet).filter_by(board_id=board_id).delete()
-
-        session.query(InfoTxt).filter_by(board_id=board_id).delete()
-        session.query(CropSchematic).filter_by(board_id=board_id).delete()
-        session.query(UserManual).filter_by(board_id=board_id).delete()
-
-        session.delete(board)
+        # Set-based deletes: every statement selects the board's rows with a
+        # subquery instead of loading them first
+        component_ids = select(Component.id).where(Component.board_id == board_id)
+        logical_net_ids = select(LogicalNet.id).where(LogicalNet.board_id == board_id)
+        layer_ids = select(Layer.id).where(Layer.board_id == board_id)
+
+        session.query(NetPin).filter(
+            NetPin.component_id.in_(component_ids) | NetPin.logical_net_id.in_(logical_net_ids)
+        ).delete(synchronize_session=False)
+        net_design_filter = NetDesign.logical_net_id.in_(logical_net_ids) | NetDesign.layer_id.in_(layer_ids)
+        session.query(NetDesignLod).filter(
+            NetDesignLod.net_design_id.in_(select(NetDesign.id).where(net_design_filter))
+        ).delete(synchronize_session=False)
+        session.query(NetDesign).filter(net_design_filter).delete(synchronize_session=False)
+
+        session.query(Component).filter_by(board_id=board_id).delete(synchronize_session=False)
+        session.query(LogicalNet).filter_by(board_id=board_id).delete(synchronize_session=False)
+        session.query(Layer).filter_by(board_id=board_id).delete(synchronize_session=False)
+
+        session.query(LlmArtifact).filter_by(board_id=board_id).delete(synchronize_session=False)
+        session.query(LlmDataJob).filter_by(board_id=board_id).delete(synchronize_session=False)
+        session.query(InfoTxt).filter_by(board_id=board_id).delete(synchronize_session=False)
+        session.query(CropSchematic).filter_by(board_id=board_id).delete(synchronize_session=False)
+        session.query(UserManualPage).filter(
+            UserManualPage.user_manual_id.in_(select(UserManual.id).where(UserManual.board_id == board_id))
+        ).delete(synchronize_session=False)
+        session.query(UserManual).filter_by(board_id=board_id).delete(synchronize_session=False)
+        rebuild_assistant_index(session, board_id)
+        session.query(AssistantContext).filter_by(board_id=board_id).delete(synchronize_session=False)
+        session.query(ChangeLog).filter_by(board_id=board_id).delete(synchronize_session=False)
+
+        session.query(Board).filter_by(id=board_id).delete(synchronize_session=False)
 
         session.commit()
         
@@ -236,6 +418,157 @@ def deep_delete_board(session, board_id):
         session.rollback()
         return False, f"Error during deep delete: {str(e)}"
 
+# Reclaim the space freed by large deletes. VACUUM rewrites the whole
+# file; incremental vacuum only frees the pages listed as free, which
+# needs auto_vacuum=INCREMENTAL (see enable_incremental_vacuum)
+def vacuum_database(incremental=False):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if incremental:
+            # The pragma frees one page per step and the driver's execute
+            # only steps once: executescript runs it to completion
+            conn.connection.driver_connection.executescript("PRAGMA incremental_vacuum")
+        else:
+            conn.execute(text("VACUUM"))
+
+
+################################################################
+# Change log for delta sync
+################################################################
+
+# Revisions of each board whose changes are kept in the change log
+CHANGE_LOG_RETENTION = 1000
+# Above this many logged changes a client is better off with a full snapshot
+MAX_DELTA_CHANGES = 2000
+
+CHANGE_LOG_MODELS = {model.__tablename__: model for model in (
+    Board, Package, Pin, Component, LogicalNet, NetPin, Layer, NetDesign
+)}
+
+def log_changes(session, board_ids, changes):
+    """
+    Add the changes of board_changed to the change log at the current
+    revision of each board. Runs inside the caller's transaction.
+    """
+    boards = select(Board.id, Board.revision).where(Board.id.in_(board_ids))
+    for model, entity_ids, operation in changes:
+        if isinstance(entity_ids, list):
+            rows = session.execute(boards).all()
+            if rows and entity_ids:
+                session.execute(insert(ChangeLog), [{
+                    "board_id": board_id,
+                    "revision": revision,
+                    "entity": model.__tablename__,
+                    "entity_id": entity_id,
+                    "operation": operation
+                } for board_id, revision in rows for entity_id in entity_ids])
+        else:
+            ids = entity_ids.subquery()
+            session.execute(insert(ChangeLog).from_select(
+                ["board_id", "revision", "entity", "entity_id", "operation"],
+                select(Board.id, Board.revision, literal(model.__tablename__), list(ids.c)[0], literal(operation))
+                .join(ids, true())
+                .where(Board.id.in_(board_ids))
+            ))
+
+def _moved(session, model, entity_id, old_board_id, board_id, *sections, brought=()):
+    # A row moved to another board is deleted from the old one and inserted
+    # in the new one; brought lists further changes of the new board
+    if old_board_id == board_id:
+        board_changed(session, [board_id], [(model, [entity_id], "update"), *brought], *sections)
+    else:
+        board_changed(session, [old_board_id], [(model, [entity_id], "delete")], *sections)
+        board_changed(session, [board_id], [(model, [entity_id], "insert"), *brought], *sections)
+
+def _package_brought(session, component):
+    """
+    Changes inserting a component's package and its pins into the change
+    log of the component's board, when no other component of the board
+    uses that package yet (clients of the delta only know the packages of
+    their board).
+    """
+    if component.package_id is None or session.query(Component.id).filter(
+        Component.board_id == component.board_id,
+        Component.package_id == component.package_id,
+        Component.id != component.id
+    ).first() is not None:
+        return []
+    return [
+        (Package, [component.package_id], "insert"),
+        (Pin, select(Pin.id).where(Pin.package_id == component.package_id), "insert")
+    ]
+
+def prune_change_log():
+    """
+    Drop the changes older than the last CHANGE_LOG_RETENTION revisions of
+    each board and those of boards that no longer exist.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            "DELETE FROM change_log WHERE NOT EXISTS ("
+            "SELECT 1 FROM board WHERE board.id = change_log.board_id "
+            "AND change_log.revision > board.revision - :retention)"
+        ), {"retention": CHANGE_LOG_RETENTION})
+
+def _row_to_dict(row):
+    return {column.name: getattr(row, column.name) for column in row.__table__.columns}
+
+def get_board_changes(session, board_id, since, uid=None):
+    """
+    Return the rows of a board inserted or updated since revision since
+    (their current values) and the ids of those deleted, or None when the
+    board does not exist. "full" is True, with no rows, when the change log
+    does not cover every revision since then, holds more than
+    MAX_DELTA_CHANGES changes or uid (the board uid the client synced
+    with, when given) is not the board's: the client should reload the
+    whole board.
+    """
+    board = get_board(session, board_id)
+    if not board:
+        return None
+
+    result = {
+        "board_id": board_id, "uid": board.uid, "since": since, "revision": board.revision,
+        "full": False, "upserted": {}, "deleted": {}
+    }
+    # The id now belongs to another board: its revisions mean nothing to the client
+    if uid is not None and uid != board.uid:
+        result["full"] = True
+        return result
+    if since == board.revision:
+        return result
+
+    changes = session.query(ChangeLog).filter(ChangeLog.board_id == board_id, ChangeLog.revision > since)
+    revisions, count = changes.with_entities(func.count(distinct(ChangeLog.revision)), func.count()).one()
+    # Every revision bump logs at least one change, so a gap means pruned
+    # (or never logged) revisions; since > revision means the board was replaced
+    if since < 0 or since > board.revision or revisions < board.revision - since or count > MAX_DELTA_CHANGES:
+        result["full"] = True
+        return result
+
+    # The last operation on a row wins
+    last = {}
+    for entity, entity_id, operation in changes.with_entities(
+        ChangeLog.entity, ChangeLog.entity_id, ChangeLog.operation
+    ).order_by(ChangeLog.id):
+        last[entity, entity_id] = operation
+
+    upserted = {}
+    for (entity, entity_id), operation in last.items():
+        if operation == "delete":
+            result["deleted"].setdefault(entity, []).append(entity_id)
+        else:
+            upserted.setdefault(entity, []).append(entity_id)
+
+    for entity, entity_ids in upserted.items():
+        model = CHANGE_LOG_MODELS[entity]
+        rows = session.query(model).filter(model.id.in_(entity_ids)).order_by(model.id).all()
+        result["upserted"][entity] = [_row_to_dict(row) for row in rows]
+        # Rows removed without a logged delete are reported as deleted
+        missing = set(entity_ids) - {row.id for row in rows}
+        if missing:
+            result["deleted"].setdefault(entity, []).extend(sorted(missing))
+    return result
+
 
 ################################################################
 # CRUD for Package
@@ -265,6 +598,7 @@ def update_package(session, package_id, name=None, height=None, polygon=None):
     if polygon is not None:
         package.polygon = polygon
 
+    board_changed(session, _boards_using_package(package_id), [(Package, [package_id], "update")])
     session.commit()
     return True
 
@@ -296,23 +630,25 @@ def deep_delete_package(session, package_id):
         if not package:
             return False, "Package not found"
 
-        pins = session.query(Pin).filter_by(package_id=package_id).all()
-        pin_ids = [pin.id for pin in pins]
+        pin_ids = select(Pin.id).where(Pin.package_id == package_id)
+        component_ids = select(Component.id).where(Component.package_id == package_id)
 
-        components = session.query(Component).filter_by(package_id=package_id).all()
-        component_ids = [comp.id for comp in components]
+        board_changed(session, _boards_using_package(package_id), [
+            (NetPin, select(NetPin.id).where(NetPin.pin_id.in_(pin_ids) | NetPin.component_id.in_(component_ids)), "delete"),
+            (Component, component_ids, "delete"),
+            (Pin, pin_ids, "delete"),
+            (Package, [package_id], "delete")
+        ], "components", "nets")
 
-        if pin_ids:
-            session.query(NetPin).filter(NetPin.pin_id.in_(pin_ids)).delete(synchronize_session=False)
+        session.query(NetPin).filter(
+            NetPin.pin_id.in_(pin_ids) | NetPin.component_id.in_(component_ids)
+        ).delete(synchronize_session=False)
 
-        if component_ids:
-            session.query(NetPin).filter(NetPin.component_id.in_(component_ids)).delete(synchronize_session=False)
+        session.query(Component).filter_by(package_id=package_id).delete(synchronize_session=False)
 
-        session.query(Component).filter_by(package_id=package_id).delete()
+        session.query(Pin).filter_by(package_id=package_id).delete(synchronize_session=False)
 
-        session.query(Pin).filter_by(package_id=package_id).delete()
-
-        session.delete(package)
+        session.query(Package).filter_by(id=package_id).delete(synchronize_session=False)
 
         session.commit()
         return True, f"Package {package_id} and all related data deleted successfully"
@@ -335,6 +671,8 @@ def get_pins_by_package(session, package_id):
 def create_pin(session, name, package_id, x=None, y=None):
     pin = Pin(name=name, x=x, y=y, package_id=package_id)
     session.add(pin)
+    session.flush()
+    board_changed(session, _boards_using_package(package_id), [(Pin, [pin.id], "insert")])
     session.commit()
     return pin
 
@@ -343,6 +681,8 @@ def update_pin(session, pin_id, name=None, x=None, y=None, package_id=None):
     if not pin:
         return False
 
+    # Boards using the pin before and after the change, bumped once
+    board_ids = set(session.scalars(_boards_using_pin(pin_id)))
     if name is not None:
         pin.name = name
     if x is not None:
@@ -352,6 +692,9 @@ def update_pin(session, pin_id, name=None, x=None, y=None, package_id=None):
     if package_id is not None:
         pin.package_id = package_id
 
+    session.flush()
+    board_ids.update(session.scalars(_boards_using_pin(pin_id)))
+    board_changed(session, list(board_ids), [(Pin, [pin_id], "update")], "nets")
     session.commit()
     return True
 
@@ -365,6 +708,7 @@ def delete_pin(session, pin_id):
         if net_connections > 0:
             return False, "Cannot delete pin: there are net connections associated with it"
 
+        board_changed(session, _boards_using_pin(pin_id), [(Pin, [pin_id], "delete")])
         session.delete(pin)
         session.commit()
         return True, "Pin deleted successfully"
@@ -379,6 +723,10 @@ def deep_delete_pin(session, pin_id):
         if not pin:
             return False, "Pin not found"
 
+        board_changed(session, _boards_using_pin(pin_id), [
+            (NetPin, select(NetPin.id).where(NetPin.pin_id == pin_id), "delete"),
+            (Pin, [pin_id], "delete")
+        ], "nets")
         session.query(NetPin).filter_by(pin_id=pin_id).delete()
 
         session.delete(pin)
@@ -412,6 +760,10 @@ def create_component(session, name, package_id, board_id, part=None, layer=None,
         y=y
     )
     session.add(component)
+    session.flush()
+    board_changed(session, [board_id], [
+        (Component, [component.id], "insert"), *_package_brought(session, component)
+    ], "components")
     session.commit()
     return component
 
@@ -421,6 +773,8 @@ def update_component(session, component_id, name=None, package_id=None, board_id
     if not component:
         return False
 
+    old_board_id = component.board_id
+    old_package_id = component.package_id
     if name is not None:
         component.name = name
     if package_id is not None:
@@ -438,6 +792,11 @@ def update_component(session, component_id, name=None, package_id=None, board_id
     if y is not None:
         component.y = y
 
+    brought = []
+    if component.board_id != old_board_id or component.package_id != old_package_id:
+        session.flush()
+        brought = _package_brought(session, component)
+    _moved(session, Component, component_id, old_board_id, component.board_id, "components", "nets", brought=brought)
     session.commit()
     return True
 
@@ -451,6 +810,7 @@ def delete_component(session, component_id):
         if net_connections > 0:
             return False, "Cannot delete component: there are net connections associated with it"
 
+        board_changed(session, [component.board_id], [(Component, [component_id], "delete")], "components")
         session.delete(component)
         session.commit()
         return True, "Component deleted successfully"
@@ -465,6 +825,10 @@ def deep_delete_component(session, component_id):
         if not component:
             return False, "Component not found"
 
+        board_changed(session, [component.board_id], [
+            (NetPin, select(NetPin.id).where(NetPin.component_id == component_id), "delete"),
+            (Component, [component_id], "delete")
+        ], "components", "nets")
         session.query(NetPin).filter_by(component_id=component_id).delete()
 
         session.delete(component)
@@ -489,6 +853,8 @@ def get_logical_nets_by_board(session, board_id):
 def create_logical_net(session, name, board_id):
     logical_net = LogicalNet(name=name, board_id=board_id)
     session.add(logical_net)
+    session.flush()
+    board_changed(session, [board_id], [(LogicalNet, [logical_net.id], "insert")], "nets")
     session.commit()
     return logical_net
 
@@ -497,11 +863,13 @@ def update_logical_net(session, logical_net_id, name=None, board_id=None):
     if not logical_net:
         return False
 
+    old_board_id = logical_net.board_id
     if name is not None:
         logical_net.name = name
     if board_id is not None:
         logical_net.board_id = board_id
 
+    _moved(session, LogicalNet, logical_net_id, old_board_id, logical_net.board_id, "nets")
     session.commit()
     return True
 
@@ -515,6 +883,7 @@ def delete_logical_net(session, logical_net_id):
         if net_connections > 0:
             return False, "Cannot delete logical net: there are net connections associated with it"
 
+        board_changed(session, [logical_net.board_id], [(LogicalNet, [logical_net_id], "delete")], "nets")
         session.delete(logical_net)
         session.commit()
         return True, "Logical net deleted successfully"
@@ -529,7 +898,16 @@ def deep_delete_logical_net(session, logical_net_id):
         if not logical_net:
             return False, "Logical net not found"
 
+        board_changed(session, [logical_net.board_id], [
+            (NetPin, select(NetPin.id).where(NetPin.logical_net_id == logical_net_id), "delete"),
+            (NetDesign, select(NetDesign.id).where(NetDesign.logical_net_id == logical_net_id), "delete"),
+            (LogicalNet, [logical_net_id], "delete")
+        ], "nets")
         session.query(NetPin).filter_by(logical_net_id=logical_net_id).delete()
+        session.query(NetDesignLod).filter(
+            NetDesignLod.net_design_id.in_(select(NetDesign.id).where(NetDesign.logical_net_id == logical_net_id))
+        ).delete(synchronize_session=False)
+        session.query(NetDesign).filter_by(logical_net_id=logical_net_id).delete()
 
         session.delete(logical_net)
         session.commit()
@@ -567,6 +945,8 @@ def create_net_pin(session, component_id, pin_id, logical_net_id):
         
         net_pin = NetPin(pin_id=pin_id, component_id=component_id, logical_net_id=logical_net_id)
         session.add(net_pin)
+        session.flush()
+        board_changed(session, _boards_of_component(component_id), [(NetPin, [net_pin.id], "insert")], "nets")
         session.commit()
         return net_pin
     else:
@@ -583,6 +963,7 @@ def update_net_pin(session, net_pin_id, pin_id=None, component_id=None, logical_
     if not net_pin:
         return False
 
+    board_ids = set(session.scalars(_boards_of_component(net_pin.component_id)))
     if pin_id is not None:
         net_pin.pin_id = pin_id
     if component_id is not None:
@@ -590,6 +971,9 @@ def update_net_pin(session, net_pin_id, pin_id=None, component_id=None, logical_
     if logical_net_id is not None:
         net_pin.logical_net_id = logical_net_id
 
+    session.flush()
+    board_ids.update(session.scalars(_boards_of_component(net_pin.component_id)))
+    board_changed(session, list(board_ids), [(NetPin, [net_pin_id], "update")], "nets")
     session.commit()
     return True
 
@@ -598,6 +982,7 @@ def delete_net_pin(session, net_pin_id):
     if not net_pin:
         return False
 
+    board_changed(session, _boards_of_component(net_pin.component_id), [(NetPin, [net_pin_id], "delete")], "nets")
     session.delete(net_pin)
     session.commit()
     return True
@@ -626,6 +1011,8 @@ def create_layer(session, name, board_id, layer_function=None, stack_order=None,
         polarity=polarity
     )
     session.add(layer)
+    session.flush()
+    board_changed(session, [board_id], [(Layer, [layer.id], "insert")])
     session.commit()
     return layer
 
@@ -641,6 +1028,7 @@ def update_layer(session, layer_id, name=None, layer_type=None, stack_order=None
     if stack_order is not None:
         layer.stack_order = stack_order
 
+    board_changed(session, [layer.board_id], [(Layer, [layer_id], "update")])
     session.commit()
     return True
 
@@ -649,6 +1037,7 @@ def delete_layer(session, layer_id):
     if not layer:
         return False
 
+    board_changed(session, [layer.board_id], [(Layer, [layer_id], "delete")])
     session.delete(layer)
     session.commit()
     return True
@@ -680,6 +1069,9 @@ def create_net_design(session, logical_net_id, layer_id, geometry_json):
         geometry_json=geometry_json
     )
     session.add(net_design)
+    session.flush()
+    build_net_design_lods(session, net_design)
+    board_changed(session, _boards_of_logical_net(logical_net_id), [(NetDesign, [net_design.id], "insert")])
     session.commit()
     return net_design
 
@@ -692,7 +1084,9 @@ def update_net_design(session, net_design_id, layer_id=None, geometry_json=None)
         net_design.layer_id = layer_id
     if geometry_json is not None:
         net_design.geometry_json = geometry_json
+        build_net_design_lods(session, net_design)
 
+    board_changed(session, _boards_of_logical_net(net_design.logical_net_id), [(NetDesign, [net_design_id], "update")])
     session.commit()
     return True
 
@@ -701,10 +1095,103 @@ def delete_net_design(session, net_design_id):
     if not net_design:
         return False
 
+    board_changed(session, _boards_of_logical_net(net_design.logical_net_id), [(NetDesign, [net_design_id], "delete")])
+    session.query(NetDesignLod).filter_by(net_design_id=net_design_id).delete()
     session.delete(net_design)
     session.commit()
     return True
 
+def build_net_design_lods(session, net_design):
+    """
+    (Re)compute the levels of detail of a net design, see geometry_lod.
+    Runs inside the caller's transaction.
+    """
+    session.query(NetDesignLod).filter_by(net_design_id=net_design.id).delete()
+    try:
+        features = json.loads(net_design.geometry_json)
+    except (TypeError, ValueError) as e:
+        print(f"Invalid geometry for net design {net_design.id}: {str(e)}")
+        return
+    for level, tolerance in LOD_TOLERANCES.items():
+        simplified = simplify_geometry(features, tolerance)
+        session.add(NetDesignLod(
+            net_design_id=net_design.id,
+            level=level,
+            geometry_json=json.dumps(simplified),
+            vertex_count=vertex_count(simplified)
+        ))
+
+def get_net_design_geometries(session, net_designs, lod=0):
+    """
+    Return {net design id: geometry_json} at a level of detail (0 is the
+    original geometry). Levels missing for net designs created before
+    they existed are computed and stored on the way.
+    """
+    geometries = {net_design.id: net_design.geometry_json for net_design in net_designs}
+    if not lod or not geometries:
+        return geometries
+
+    def load(ids):
+        return dict(session.query(NetDesignLod.net_design_id, NetDesignLod.geometry_json).filter(
+            NetDesignLod.net_design_id.in_(ids), NetDesignLod.level == lod
+        ))
+
+    simplified = load(list(geometries))
+    missing = [net_design for net_design in net_designs if net_design.id not in simplified]
+    if missing:
+        missing_ids = [net_design.id for net_design in missing]
+        try:
+            for net_design in missing:
+                build_net_design_lods(session, net_design)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Error building levels of detail: {str(e)}")
+        simplified.update(load(missing_ids))
+
+    # Net designs whose geometry could not be parsed keep the original
+    geometries.update(simplified)
+    return geometries
+
+def get_net_highlight(session, logical_net_id):
+    """
+    Return everything needed to highlight a logical net with three queries:
+    (net row with the board uid and revision, pin rows with their component
+    placement, net design rows with their layer), or None when the net
+    does not exist.
+    """
+    net = session.execute(
+        select(LogicalNet.id, LogicalNet.name, LogicalNet.board_id, Board.uid, Board.revision)
+        .join(Board, LogicalNet.board_id == Board.id)
+        .where(LogicalNet.id == logical_net_id)
+    ).first()
+    if net is None:
+        return None
+
+    pins = session.execute(
+        select(
+            Component.id.label("component_id"), Component.name.label("component_name"),
+            Component.part, Component.layer, Component.rotation, Component.x, Component.y,
+            Pin.id.label("pin_id"), Pin.name.label("pin_name"), Pin.x.label("pin_x"), Pin.y.label("pin_y")
+        )
+        .select_from(NetPin)
+        .join(Component, NetPin.component_id == Component.id)
+        .join(Pin, NetPin.pin_id == Pin.id)
+        .where(NetPin.logical_net_id == logical_net_id)
+        .order_by(Component.name, Component.id, Pin.name)
+    ).all()
+
+    designs = session.execute(
+        select(
+            NetDesign.id, NetDesign.geometry_json,
+            Layer.id.label("layer_id"), Layer.name.label("layer_name"), Layer.side
+        )
+        .join(Layer, NetDesign.layer_id == Layer.id)
+        .where(NetDesign.logical_net_id == logical_net_id)
+        .order_by(Layer.stack_order, Layer.id, NetDesign.id)
+    ).all()
+    return net, pins, designs
+
 
 ################################################################
 # CRUD for info_txt
@@ -719,6 +1206,9 @@ def get_info_txt_by_board(session, board_id):
 def create_info_txt(session, board_id, file_txt):
     info_txt = InfoTxt(board_id=board_id, file_txt=file_txt)
     session.add(info_txt)
+    session.flush()
+    rebuild_assistant_index(session, board_id)
+    mark_assistant_context_stale(session, [board_id], "notes")
     session.commit()
     return info_txt
 
@@ -727,11 +1217,16 @@ def update_info_txt(session, info_txt_id, board_id=None, file_txt=None):
     if not info_txt:
         return False
 
+    old_board_id = info_txt.board_id
     if board_id is not None:
         info_txt.board_id = board_id
     if file_txt is not None:
         info_txt.file_txt = file_txt
 
+    session.flush()
+    for affected_board_id in {old_board_id, info_txt.board_id}:
+        rebuild_assistant_index(session, affected_board_id)
+    mark_assistant_context_stale(session, [old_board_id, info_txt.board_id], "notes")
     session.commit()
     return True
 
@@ -740,7 +1235,11 @@ def delete_info_txt(session, info_txt_id):
     if not info_txt:
         return False
 
+    session.query(LlmArtifact).filter_by(info_txt_id=info_txt_id).delete()
     session.delete(info_txt)
+    session.flush()
+    rebuild_assistant_index(session, info_txt.board_id)
+    mark_assistant_context_stale(session, [info_txt.board_id], "notes")
     session.commit()
     return True
 
@@ -797,6 +1296,11 @@ def get_user_manual_by_board(session, board_id):
 def create_user_manual(session, board_id, file_pdf):
     user_manual = UserManual(board_id=board_id, file_pdf=file_pdf)
     session.add(user_manual)
+    session.flush()
+    _save_user_manual_pages(session, user_manual)
+    session.flush()
+    rebuild_assistant_index(session, board_id)
+    mark_assistant_context_stale(session, [board_id], "manual")
     session.commit()
     return user_manual
 
@@ -805,11 +1309,18 @@ def update_user_manual(session, user_manual_id, board_id=None, file_pdf=None):
     if not user_manual:
         return False
 
+    old_board_id = user_manual.board_id
     if board_id is not None:
         user_manual.board_id = board_id
     if file_pdf is not None:
         user_manual.file_pdf = file_pdf
+        session.query(UserManualPage).filter_by(user_manual_id=user_manual_id).delete()
+        _save_user_manual_pages(session, user_manual)
 
+    session.flush()
+    for affected_board_id in {old_board_id, user_manual.board_id}:
+        rebuild_assistant_index(session, affected_board_id)
+    mark_assistant_context_stale(session, [old_board_id, user_manual.board_id], "manual")
     session.commit()
     return True
 
@@ -818,104 +1329,568 @@ def delete_user_manual(session, user_manual_id):
     if not user_manual:
         return False
 
+    session.query(UserManualPage).filter_by(user_manual_id=user_manual_id).delete()
     session.delete(user_manual)
+    session.flush()
+    rebuild_assistant_index(session, user_manual.board_id)
+    mark_assistant_context_stale(session, [user_manual.board_id], "manual")
     session.commit()
     return True
 
 
+def get_user_manual_pages(session, user_manual_id):
+    return session.query(UserManualPage).filter_by(user_manual_id=user_manual_id).order_by(UserManualPage.page_number).all()
+
+def extract_pdf_pages(file_pdf):
+    """
+    Extract the text of every page of a PDF, returning a list of
+    (page_number, text) tuples. Pages that fail to extract are kept empty.
+    """
+    if not file_pdf:
+        return []
+
+    try:
+        reader = PdfReader(io.BytesIO(file_pdf))
+    except Exception as e:
+        print(f"Error processing PDF: {e}")
+        return []
+
+    pages = []
+    for i, page in enumerate(reader.pages):
+        try:
+            text = page.extract_text() or ""
+        except Exception as page_error:
+            print(f"Error extracting text from page {i+1}: {page_error}")
+            text = ""
+        pages.append((i + 1, text))
+    return pages
+
+def _save_user_manual_pages(session, user_manual):
+    for page_number, text in extract_pdf_pages(user_manual.file_pdf):
+        session.add(UserManualPage(user_manual_id=user_manual.id, page_number=page_number, text=text))
+    user_manual.pages_extracted = True
+
+def backfill_user_manual_pages():
+    """
+    Extract the pages of manuals uploaded before page extraction existed.
+    Manuals whose extraction already ran are skipped, with or without pages.
+    """
+    session = Session()
+    try:
+        # Manuals extracted before the flag existed only need to be marked
+        session.query(UserManual).filter(
+            UserManual.pages_extracted == false(), UserManual.pages.any()
+        ).update({UserManual.pages_extracted: True}, synchronize_session=False)
+        manuals = session.query(UserManual).filter(UserManual.pages_extracted == false()).all()
+        for user_manual in manuals:
+            _save_user_manual_pages(session, user_manual)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"Error extracting user manual pages: {str(e)}")
+    finally:
+        session.close()
+
+
 ################################################################
-# CRUD for LLM Data Generation
+# Retrieval index for the assistant
 ################################################################
 
-def save_texts_to_database(session, board_id, text_file_content):
+# Chunks are page- or paragraph-sized pieces of the manual and info texts,
+# indexed with SQLite FTS5 so that the assistant can rank them with BM25
+ASSISTANT_CHUNK_CHARS = 800
+
+def init_assistant_index():
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS assistant_chunk "
+                "USING fts5(content, board_id UNINDEXED, source UNINDEXED, ref UNINDEXED, tokenize = 'porter unicode61')"
+            ))
+    except Exception as e:
+        print(f"Error creating assistant index (FTS5 not available?): {str(e)}")
+        return
+
+    # Index boards whose texts were uploaded before the index existed
+    session = Session()
     try:
-        return _save_texts(session, board_id, text_file_content)
+        board_ids = session.execute(text(
+            "SELECT board_id FROM user_manual UNION SELECT board_id FROM info_txt "
+            "EXCEPT SELECT board_id FROM assistant_chunk"
+        )).scalars().all()
+        for board_id in board_ids:
+            rebuild_assistant_index(session, board_id)
+        session.commit()
     except Exception as e:
         session.rollback()
-        print(f"Error saving to database: {str(e)}")
+        print(f"Error building assistant index: {str(e)}")
+    finally:
+        session.close()
+
+# Heading of a line ("VCC: ...", "Page 3: ..."), repeated in every piece
+# of a line too long for one chunk
+LINE_PREFIX_PATTERN = re.compile(r"^[^:]{1,80}:\s+")
+
+def split_long_line(line, max_chars=ASSISTANT_CHUNK_CHARS):
+    """
+    Split a line into pieces of at most max_chars, breaking on ", " first,
+    then on spaces, and cutting only words that fit nowhere. Every piece
+    starts with the line's prefix, so that it keeps its net or heading.
+    """
+    match = LINE_PREFIX_PATTERN.match(line)
+    prefix = match.group(0) if match and match.end() <= max_chars // 4 else ""
+    room = max_chars - len(prefix)
+
+    # (separator, text) units, in order
+    units = []
+    for item in line[len(prefix):].split(", "):
+        words = [item] if len(item) <= room else item.split(" ")
+        for i, word in enumerate(words):
+            separator = " " if i else ", "
+            while len(word) > room:
+                units.append((separator, word[:room]))
+                word = word[room:]
+                separator = ""
+            if word:
+                units.append((separator, word))
+
+    pieces = []
+    current = ""
+    for separator, unit in units:
+        if current and len(current) + len(separator) + len(unit) > room:
+            pieces.append(prefix + current)
+            current = unit
+        else:
+            current = current + separator + unit if current else unit
+    if current:
+        pieces.append(prefix + current)
+    return pieces
+
+def chunk_text(content, max_chars=ASSISTANT_CHUNK_CHARS):
+    """
+    Split a text into chunks of at most max_chars, breaking on paragraphs
+    first, then on lines for paragraphs that are too long and within lines
+    that are too long (see split_long_line).
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", content):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for line in paragraph.splitlines():
+            line = line.strip()
+            if len(line) > max_chars:
+                pieces.extend(split_long_line(line, max_chars))
+            elif line:
+                pieces.append(line)
+
+    # Merge consecutive small pieces up to the chunk size
+    chunks = []
+    current = []
+    current_len = 0
+    for piece in pieces:
+        if current and current_len + len(piece) + 1 > max_chars:
+            chunks.append("\n".join(current))
+            current = []
+            current_len = 0
+        current.append(piece)
+        current_len += len(piece) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+def _user_info_txts(session, board_id):
+    """
+    Return the info texts of a board written by users, leaving out those
+    generate_llm_data writes (LlmArtifact): their lines repeat the
+    components and nets sections of the context bundle.
+    """
+    return session.query(InfoTxt).filter(
+        InfoTxt.board_id == board_id,
+        InfoTxt.id.notin_(select(LlmArtifact.info_txt_id))
+    ).order_by(InfoTxt.id).all()
+
+def rebuild_assistant_index(session, board_id):
+    """
+    Re-index the manual pages and info texts of a board. Runs inside the
+    caller's transaction.
+    """
+    if board_id is None:
+        return
+
+    try:
+        session.execute(text("DELETE FROM assistant_chunk WHERE board_id = :board_id"), {"board_id": board_id})
+    except Exception as e:
+        # The index is optional: without FTS5 the assistant falls back to the raw texts
+        print(f"Assistant index not available: {str(e)}")
+        return
+
+    rows = []
+    pages = session.query(UserManualPage).join(UserManual).filter(
+        UserManual.board_id == board_id
+    ).order_by(UserManualPage.user_manual_id, UserManualPage.page_number).all()
+    for page in pages:
+        for chunk in chunk_text(page.text):
+            rows.append({"content": chunk, "board_id": board_id, "source": "manual", "ref": f"Page {page.page_number}"})
+
+    for info_txt in _user_info_txts(session, board_id):
+        try:
+            info_text = info_txt.file_txt.decode('utf-8') if info_txt.file_txt else ""
+        except UnicodeDecodeError as e:
+            print(f"Error decoding text file: {e}")
+            continue
+        for chunk in chunk_text(info_text):
+            rows.append({"content": chunk, "board_id": board_id, "source": "info", "ref": ""})
+
+    if rows:
+        session.execute(text(
+            "INSERT INTO assistant_chunk (content, board_id, source, ref) "
+            "VALUES (:content, :board_id, :source, :ref)"
+        ), rows)
+
+
+################################################################
+# Context bundle for the assistant
+################################################################
+
+# Ready-to-use prompt context per board, one row per section. Mutations
+# only mark the affected sections stale; refresh_assistant_context rebuilds
+# them before the assistant reads the bundle. Budgets are in tokens,
+# estimated at ASSISTANT_CHARS_PER_TOKEN characters each. Components, nets
+# and notes share one prompt section of 3000 characters (PROMPT_SECTION_CHARS
+# of the assistant) with the retrieved info chunks, which come first and take
+# at most 1000 (RETRIEVED_INFO_CHARS): the three budgets fill the rest
+ASSISTANT_CONTEXT_BUDGETS = {
+    "components": 150,
+    "nets": 250,
+    "notes": 100,
+    "manual": 350
+}
+ASSISTANT_CHARS_PER_TOKEN = 4
+MANUAL_HIGHLIGHT_CHARS = 300
+
+# Lines of the info texts written by generate_llm_data, already covered by
+# the components and nets sections
+GENERATED_INFO_LINE = re.compile(r"^(\d+\. \S+ - |Logical net .* connects )")
+
+def estimate_tokens(content):
+    return (len(content) + ASSISTANT_CHARS_PER_TOKEN - 1) // ASSISTANT_CHARS_PER_TOKEN
+
+def _natural_key(name):
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name or "")]
+
+def _fit_to_budget(title, lines, max_tokens):
+    """
+    Join the section title and as many lines as fit in max_tokens, noting
+    how many lines were left out.
+    """
+    kept = [title]
+    used = estimate_tokens(title)
+    for i, line in enumerate(lines):
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            kept.append(f"({len(lines) - i} more not listed)")
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept) if len(kept) > 1 else ""
+
+def _build_components_section(session, board_id):
+    groups = {}
+    for name, part in session.query(Component.name, Component.part).filter_by(board_id=board_id):
+        groups.setdefault(part or "unspecified part", set()).add(name)
+
+    lines = [
+        f"{part}: {', '.join(sorted(names, key=_natural_key))}"
+        for part, names in sorted(groups.items(), key=lambda item: _natural_key(min(item[1], key=_natural_key)))
+    ]
+    return _fit_to_budget("Components by part:", lines, ASSISTANT_CONTEXT_BUDGETS["components"])
+
+def _build_nets_section(session, board_id):
+    nets = {}
+    rows = session.query(LogicalNet.name, Component.name, Pin.name).join(
+        NetPin, NetPin.logical_net_id == LogicalNet.id
+    ).join(Component, NetPin.component_id == Component.id).join(
+        Pin, NetPin.pin_id == Pin.id
+    ).filter(LogicalNet.board_id == board_id)
+    for net_name, component_name, pin_name in rows:
+        if net_name.startswith("Unused"):
+            continue
+        nets.setdefault(net_name, set()).add((component_name, pin_name))
+
+    lines = [
+        f"{net_name}: " + ", ".join(
+            f"{component_name} at P{pin_name}"
+            for component_name, pin_name in sorted(connections, key=lambda c: (_natural_key(c[0]), _natural_key(c[1])))
+        )
+        for net_name, connections in sorted(nets.items(), key=lambda item: _natural_key(item[0]))
+    ]
+    return _fit_to_budget("Logical net connections:", lines, ASSISTANT_CONTEXT_BUDGETS["nets"])
+
+def _build_notes_section(session, board_id):
+    lines = {}
+    for info_txt in _user_info_txts(session, board_id):
+        try:
+            info_text = info_txt.file_txt.decode('utf-8') if info_txt.file_txt else ""
+        except UnicodeDecodeError as e:
+            print(f"Error decoding text file: {e}")
+            continue
+        for line in info_text.splitlines():
+            line = line.strip()
+            if line and not GENERATED_INFO_LINE.match(line):
+                lines.setdefault(" ".join(line.lower().split()), line)
+    return _fit_to_budget("Notes:", list(lines.values()), ASSISTANT_CONTEXT_BUDGETS["notes"])
+
+def _build_manual_section(session, board_id):
+    pages = session.query(UserManualPage).join(UserManual).filter(
+        UserManual.board_id == board_id
+    ).order_by(UserManualPage.user_manual_id, UserManualPage.page_number).all()
+
+    # Lines repeated on many pages are headers and footers
+    page_lines = [[line.strip() for line in page.text.splitlines() if line.strip()] for page in pages]
+    counts = {}
+    for lines in page_lines:
+        for line in set(lines):
+            counts[line] = counts.get(line, 0) + 1
+    repeated = max(2, len(pages) // 2)
+
+    highlights = []
+    seen = set()
+    for page, lines in zip(pages, page_lines):
+        highlight = " ".join(line for line in lines if counts[line] < repeated)[:MANUAL_HIGHLIGHT_CHARS]
+        if highlight and highlight not in seen:
+            seen.add(highlight)
+            highlights.append(f"Page {page.page_number}: {highlight}")
+    return _fit_to_budget("Manual highlights:", highlights, ASSISTANT_CONTEXT_BUDGETS["manual"])
+
+ASSISTANT_CONTEXT_BUILDERS = {
+    "components": _build_components_section,
+    "nets": _build_nets_section,
+    "notes": _build_notes_section,
+    "manual": _build_manual_section
+}
+
+def _boards_of_component(component_id):
+    return select(Component.board_id).where(Component.id == component_id)
+
+def _boards_using_package(package_id):
+    return select(Component.board_id).where(Component.package_id == package_id)
+
+def _boards_of_logical_net(logical_net_id):
+    return select(LogicalNet.board_id).where(LogicalNet.id == logical_net_id)
+
+def _boards_using_pin(pin_id):
+    return select(Component.board_id).where(
+        Component.package_id == select(Pin.package_id).where(Pin.id == pin_id).scalar_subquery()
+    )
+
+def mark_assistant_context_stale(session, board_ids, *sections):
+    """
+    Mark sections of the context bundle of the given boards (a list of ids
+    or a subquery) for rebuild. Runs inside the caller's transaction.
+    """
+    if isinstance(board_ids, list):
+        board_ids = [board_id for board_id in board_ids if board_id is not None]
+        if not board_ids:
+            return
+    session.query(AssistantContext).filter(
+        AssistantContext.board_id.in_(board_ids), AssistantContext.section.in_(sections)
+    ).update({"stale": True}, synchronize_session=False)
+
+def refresh_assistant_context(session, board_id):
+    """
+    Rebuild the missing or stale sections of a board's context bundle.
+    Returns True when the bundle is up to date.
+    """
+    if not get_board(session, board_id):
         return False
 
-def _save_texts(session, board_id, text_file_content):
-    text_file_bytes = text_file_content.encode()
+    try:
+        rows = {row.section: row for row in session.query(AssistantContext).filter_by(board_id=board_id)}
+        changed = False
+        for section, builder in ASSISTANT_CONTEXT_BUILDERS.items():
+            row = rows.get(section)
+            if row is not None and not row.stale:
+                continue
+            content = builder(session, board_id)
+            if row is None:
+                session.add(AssistantContext(board_id=board_id, section=section, content=content, stale=False))
+            else:
+                row.content = content
+                row.stale = False
+            changed = True
+        if changed:
+            session.commit()
+        return True
+    except Exception as e:
+        session.rollback()
+        print(f"Error refreshing assistant context: {str(e)}")
+        return False
 
-    # Save both texts to database
-    create_info_txt(session, board_id, text_file_bytes)
 
-    # Commit the transaction
-    session.commit()
-    return True
+################################################################
+# CRUD for LLM Data Generation
+################################################################
 
-def generate_logical_net_text(source_db_path, board_id):
-    conn = sqlite3.connect(source_db_path)
-    cursor = conn.cursor()
-    
+def iter_logical_net_lines(connection, board_id):
+    """
+    Yield one text line per logical net, from a single query ordered by net
+    name so that connections are grouped while the rows are streamed.
+    Nets with the same name are merged, "Unused" nets are skipped.
+    """
+    query = """
+    SELECT ln.name AS net_name, c.name AS component_name, p.name AS pin_name
+    FROM logical_net ln
+    JOIN net_pin np ON np.logical_net_id = ln.id
+    JOIN component c ON np.component_id = c.id
+    JOIN pin p ON np.pin_id = p.id
+    """
+    params = {}
     if board_id:
-        cursor.execute("SELECT DISTINCT ln.name FROM logical_net ln WHERE ln.board_id = ?", (board_id,))
-    else:
-        cursor.execute("SELECT DISTINCT ln.name FROM logical_net ln")
-    
-    logical_nets = cursor.fetchall()
-    logical_net_content = ""
-
-    for net_name_tuple in logical_nets:
-        net_name = net_name_tuple[0]
-        query = """
-        SELECT c.name AS component_name, p.name AS pin_name 
-        FROM net_pin np
-        JOIN logical_net ln ON np.logical_net_id = ln.id
-        JOIN component c ON np.component_id = c.id
-        JOIN pin p ON np.pin_id = p.id
-        WHERE ln.name = ?
-        """
-        
-        params = [net_name]
-        if board_id:
-            query += " AND ln.board_id = ?"
-            params.append(board_id)
-            
-        cursor.execute(query, params)
-        connections = cursor.fetchall()
-        connection_strings = [f"{comp} at P{pin}" for comp, pin in connections]
-        
-        if not net_name.startswith("Unused"):
-            logical_net_content += f"Logical net {net_name} connects {', '.join(connection_strings)}.\n"
-    
+        query += " WHERE ln.board_id = :board_id"
+        params["board_id"] = board_id
+    query += " ORDER BY ln.name, np.id"
+
+    rows = connection.execute(text(query), params)
+    for net_name, connections in groupby(rows, key=lambda row: row.net_name):
+        if net_name.startswith("Unused"):
+            continue
+        connection_strings = [f"{row.component_name} at P{row.pin_name}" for row in connections]
+        yield f"Logical net {net_name} connects {', '.join(connection_strings)}.\n"
+
+def generate_logical_net_text(board_id):
+    with engine.connect() as connection:
+        logical_net_content = "".join(iter_logical_net_lines(connection, board_id))
     print(f"Logical net connections generated.")
-    conn.close()
-    
-    # Create a new session for database operations
-    session = Session()
-    # Save to database
-    save_texts_to_database(session, board_id, logical_net_content)
+    return logical_net_content
 
-def generate_component_list(source_db_path, board_id):
-    conn = sqlite3.connect(source_db_path)
-    cursor = conn.cursor()
-    
+def generate_component_list(board_id):
     query = "SELECT name, part FROM component"
-    params = []
+    params = {}
     if board_id:
-        query += " WHERE board_id = ?"
-        params.append(board_id)
+        query += " WHERE board_id = :board_id"
+        params["board_id"] = board_id
     query += " ORDER BY name"
-    
-    cursor.execute(query, params)
-    components = cursor.fetchall()
-    
-    component_list_content = ""
-    
-    for i, comp in enumerate(components, 1):
-        component_name = comp[0]
-        component_part = comp[1]
-        component_list_content += f"{i}. {component_name} - {component_part}\n"
-    
+
+    with engine.connect() as connection:
+        rows = connection.execute(text(query), params)
+        component_list_content = "".join(
+            f"{i}. {component_name} - {component_part}\n"
+            for i, (component_name, component_part) in enumerate(rows, 1)
+        )
     print(f"Component list generated.")
-    conn.close()
-    
-    # Create a new session for database operations
-    session = Session()
-    # Save to database
-    save_texts_to_database(session, board_id, component_list_content)
+    return component_list_content
+
+# Texts generated for the assistant, by artifact kind
+LLM_ARTIFACT_GENERATORS = {
+    "logical_nets": generate_logical_net_text,
+    "components": generate_component_list
+}
+
+def _is_generated_info_txt(info_txt):
+    try:
+        lines = [line for line in (info_txt.file_txt or b"").decode('utf-8').splitlines() if line.strip()]
+    except UnicodeDecodeError:
+        return False
+    return bool(lines) and all(GENERATED_INFO_LINE.match(line) for line in lines)
+
+def generate_llm_data(session, board_id, force=False):
+    """
+    Generate the assistant texts of a board, one info text per artifact
+    kind, updated in place. Artifacts already generated at the board's
+    current revision are skipped unless force is set. Returns a dict
+    mapping each kind to "generated" or "unchanged", or None when the
+    board does not exist.
+    """
+    board = get_board(session, board_id)
+    if not board:
+        return None
+    revision = board.revision
+
+    try:
+        artifacts = {artifact.kind: artifact for artifact in session.query(LlmArtifact).filter_by(board_id=board_id)}
+
+        # Info texts generated before artifacts were tracked would duplicate the new ones
+        if not artifacts:
+            for info_txt in session.query(InfoTxt).filter_by(board_id=board_id).all():
+                if _is_generated_info_txt(info_txt):
+                    session.delete(info_txt)
+
+        results = {}
+        for kind, generate in LLM_ARTIFACT_GENERATORS.items():
+            artifact = artifacts.get(kind)
+            if artifact is not None and artifact.info_txt is not None and artifact.revision == revision and not force:
+                results[kind] = "unchanged"
+                continue
+
+            file_txt = generate(board_id).encode()
+            if artifact is not None and artifact.info_txt is not None:
+                artifact.info_txt.file_txt = file_txt
+                artifact.revision = revision
+            else:
+                info_txt = InfoTxt(board_id=board_id, file_txt=file_txt)
+                session.add(info_txt)
+                session.flush()
+                if artifact is None:
+                    session.add(LlmArtifact(board_id=board_id, kind=kind, info_txt_id=info_txt.id, revision=revision))
+                else:
+                    artifact.info_txt_id = info_txt.id
+                    artifact.revision = revision
+            results[kind] = "generated"
+
+        if "generated" in results.values():
+            session.flush()
+            rebuild_assistant_index(session, board_id)
+            mark_assistant_context_stale(session, [board_id], "notes")
+        session.commit()
+        return results
+    except Exception as e:
+        session.rollback()
+        print(f"Error generating LLM data: {str(e)}")
+        raise
+
+# A job still running after this many seconds is considered lost (its
+# replica stopped) and may be started again
+LLM_DATA_JOB_TIMEOUT = 600
+
+def start_llm_data_job(session, board_id):
+    """
+    Record a background generation of a board's LLM data as running, unless
+    one is already running. Returns True when the caller should run it.
+    """
+    now = time.time()
+    statement = sqlite_insert(LlmDataJob).values(board_id=board_id, status="running", started_at=now, result=None)
+    statement = statement.on_conflict_do_update(
+        index_elements=[LlmDataJob.board_id],
+        set_={"status": "running", "started_at": now, "result": None},
+        where=(LlmDataJob.status != "running") | (LlmDataJob.started_at < now - LLM_DATA_JOB_TIMEOUT)
+    )
+    started = session.execute(statement).rowcount > 0
+    session.commit()
+    return started
+
+def finish_llm_data_job(session, board_id, status, result):
+    session.query(LlmDataJob).filter_by(board_id=board_id).update(
+        {LlmDataJob.status: status, LlmDataJob.result: json.dumps(result)}, synchronize_session=False
+    )
+    session.commit()
+
+def get_llm_data_job(session, board_id):
+    """
+    Return the status of the last background generation for a board, or
+    None when there was none.
+    """
+    job = session.query(LlmDataJob).filter_by(board_id=board_id).first()
+    if job is None:
+        return None
+    if job.status == "running":
+        if job.started_at < time.time() - LLM_DATA_JOB_TIMEOUT:
+            return {"status": "failed", "board_id": board_id, "error": "The generation did not finish"}
+        return {"status": "running", "board_id": board_id}
+    return {"status": job.status, "board_id": board_id, **json.loads(job.result or "{}")}
 
 
 ################################################################
@@ -925,14 +1900,26 @@ def generate_component_list(source_db_path, board_id):
 def clear_all_database(session):
     try:
         session.query(NetPin).delete()
+        session.query(NetDesignLod).delete()
+        session.query(NetDesign).delete()
+        session.query(LlmArtifact).delete()
+        session.query(LlmDataJob).delete()
         
         session.query(Component).delete()
         session.query(Pin).delete()
         session.query(LogicalNet).delete()
+        session.query(Layer).delete()
         
         session.query(InfoTxt).delete()
         session.query(CropSchematic).delete()
+        session.query(UserManualPage).delete()
         session.query(UserManual).delete()
+        try:
+            session.execute(text("DELETE FROM assistant_chunk"))
+        except Exception as e:
+            print(f"Assistant index not available: {str(e)}")
+        session.query(AssistantContext).delete()
+        session.query(ChangeLog).delete()
         
         session.query(Package).delete()
         session.query(Board).delete()
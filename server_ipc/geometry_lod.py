@@ -0,0 +1,209 @@
+import math
+
+################################################################
+# Level-of-detail geometry for net designs
+################################################################
+
+# Level -> tolerance (mm): the largest distance a simplified outline may
+# stray from the original. Level 0 is the original geometry
+LOD_TOLERANCES = {1: 0.005, 2: 0.05, 3: 0.2}
+
+# Endpoints closer than this (mm) are the same point when chaining segments
+JOIN_PRECISION = 6
+
+def arc_points(start, end, center, clockwise, tolerance):
+    """
+    Tessellate an arc from start to end around center into points whose
+    chords stay within tolerance of the arc. start == end is a full circle.
+    """
+    radius = math.hypot(start[0] - center[0], start[1] - center[1])
+    if radius <= tolerance:
+        return [start, end]
+
+    a0 = math.atan2(start[1] - center[1], start[0] - center[0])
+    a1 = math.atan2(end[1] - center[1], end[0] - center[0])
+    sweep = a1 - a0
+    if clockwise and sweep >= 0:
+        sweep -= 2 * math.pi
+    elif not clockwise and sweep <= 0:
+        sweep += 2 * math.pi
+
+    # A chord spanning step radians sags radius * (1 - cos(step / 2))
+    step = 2 * math.acos(1 - tolerance / radius)
+    segments = max(1, math.ceil(abs(sweep) / step))
+    points = [start]
+    for i in range(1, segments):
+        angle = a0 + sweep * i / segments
+        points.append((center[0] + radius * math.cos(angle), center[1] + radius * math.sin(angle)))
+    points.append(end)
+    return points
+
+def merge_collinear(points):
+    """Drop the points lying on the straight line between their neighbours."""
+    if len(points) < 3:
+        return list(points)
+    merged = [points[0]]
+    for i in range(1, len(points) - 1):
+        a, b, c = merged[-1], points[i], points[i + 1]
+        abx, aby = b[0] - a[0], b[1] - a[1]
+        bcx, bcy = c[0] - b[0], c[1] - b[1]
+        cross = abx * bcy - aby * bcx
+        if abs(cross) <= 1e-12 * max(1.0, math.hypot(abx, aby) * math.hypot(bcx, bcy)) and abx * bcx + aby * bcy >= 0:
+            continue
+        merged.append(b)
+    merged.append(points[-1])
+    return merged
+
+def _distance_to_segment(p, a, b):
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length = dx * dx + dy * dy
+    if length == 0:
+        return math.hypot(p[0] - a[0], p[1] - a[1])
+    t = max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length))
+    return math.hypot(p[0] - a[0] - t * dx, p[1] - a[1] - t * dy)
+
+def douglas_peucker(points, tolerance):
+    """Simplify a polyline keeping every point farther than tolerance from it."""
+    if len(points) < 3:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        farthest, distance = None, tolerance
+        for i in range(first + 1, last):
+            d = _distance_to_segment(points[i], points[first], points[last])
+            if d > distance:
+                farthest, distance = i, d
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+def simplify_points(points, tolerance, closed=False):
+    simplified = douglas_peucker(merge_collinear(points), tolerance)
+    # A ring needs three distinct points plus the closing one
+    if closed and len(simplified) < 4:
+        return merge_collinear(points)
+    return simplified
+
+def _key(point):
+    return (round(point[0], JOIN_PRECISION), round(point[1], JOIN_PRECISION))
+
+def _chain_segments(segments):
+    """
+    Join segments (lists of points) sharing an endpoint into the longest
+    chains found greedily, reversing segments where needed.
+    """
+    ends = {}
+    for i, points in enumerate(segments):
+        ends.setdefault(_key(points[0]), []).append(i)
+        ends.setdefault(_key(points[-1]), []).append(i)
+
+    used = [False] * len(segments)
+
+    def next_segment(point):
+        for j in ends.get(_key(point), ()):
+            if not used[j]:
+                used[j] = True
+                points = segments[j]
+                return points if _key(points[0]) == _key(point) else points[::-1]
+        return None
+
+    chains = []
+    for i, points in enumerate(segments):
+        if used[i]:
+            continue
+        used[i] = True
+        chain = list(points)
+        for forward in (True, False):
+            while True:
+                segment = next_segment(chain[-1] if forward else chain[0])
+                if segment is None:
+                    break
+                if forward:
+                    chain.extend(segment[1:])
+                else:
+                    chain[:0] = segment[::-1][:-1]
+        chains.append(chain)
+    return chains
+
+def polygon_points(points, tolerance):
+    """
+    Return the (x, y) outline of IPC polygon points (PolyBegin, PolySegment
+    and PolyStepCurve dicts), with curves tessellated within tolerance.
+    """
+    coordinates = []
+    for point in points:
+        xy = (point.get('x', 0.0), point.get('y', 0.0))
+        if point.get('type') == 'PolyStepCurve' and coordinates:
+            center = (point.get('centerX', 0.0), point.get('centerY', 0.0))
+            coordinates.extend(arc_points(coordinates[-1], xy, center, point.get('clockwise', False), tolerance)[1:])
+        else:
+            coordinates.append(xy)
+    return coordinates
+
+def simplify_geometry(features, tolerance):
+    """
+    Return a level of detail of net design features (the geometry_json
+    list written by read_IPC): Lines and Arcs of the same style become
+    chained "Polyline" features with points [[x, y], ...]; Polygon curves
+    are tessellated and outlines simplified into plain PolySegment points;
+    Circles are kept as they are.
+    """
+    strokes = {}  # (lineWidth, lineEnd, lineProperty) -> segments
+    simplified = []
+    for feature in features:
+        kind = feature.get('type')
+        if kind == 'Line':
+            points = [(feature.get('startX', 0.0), feature.get('startY', 0.0)),
+                      (feature.get('endX', 0.0), feature.get('endY', 0.0))]
+        elif kind == 'Arc':
+            points = arc_points(
+                (feature.get('startX', 0.0), feature.get('startY', 0.0)),
+                (feature.get('endX', 0.0), feature.get('endY', 0.0)),
+                (feature.get('centerX', 0.0), feature.get('centerY', 0.0)),
+                feature.get('clockwise', False),
+                tolerance
+            )
+        elif kind == 'Polygon':
+            outline = simplify_points(polygon_points(feature.get('points', []), tolerance), tolerance, closed=True)
+            simplified.append({
+                "type": "Polygon",
+                "points": [
+                    {"type": "PolyBegin" if i == 0 else "PolySegment", "x": x, "y": y}
+                    for i, (x, y) in enumerate(outline)
+                ]
+            })
+            continue
+        else:
+            simplified.append(feature)
+            continue
+        style = (feature.get('lineWidth'), feature.get('lineEnd'), feature.get('lineProperty'))
+        strokes.setdefault(style, []).append(points)
+
+    for (line_width, line_end, line_property), segments in strokes.items():
+        for chain in _chain_segments(segments):
+            simplified.append({
+                "type": "Polyline",
+                "points": [[x, y] for x, y in simplify_points(chain, tolerance)],
+                "lineWidth": line_width,
+                "lineEnd": line_end,
+                "lineProperty": line_property
+            })
+    return simplified
+
+def vertex_count(features):
+    """Number of points of the features (Circles count as one)."""
+    count = 0
+    for feature in features:
+        kind = feature.get('type')
+        if kind in ('Polyline', 'Polygon'):
+            count += len(feature.get('points', []))
+        elif kind in ('Line', 'Arc'):
+            count += 2
+        else:
+            count += 1
+    return count
@@ -0,0 +1,196 @@
+from array import array
+from collections import OrderedDict, deque
+import threading
+
+from sqlalchemy import text
+
+from database_ipc import board_version, engine
+
+################################################################
+# Connectivity graph of a board
+################################################################
+
+# Graphs kept in memory for the most recently queried boards
+GRAPH_CACHE_SIZE = 8
+
+class NetlistGraph:
+    """
+    Bipartite component <-> logical net graph of a board in CSR form:
+    the nets of component i are net_index[component_offsets[i]:component_offsets[i + 1]]
+    and the components of net j are component_index[net_offsets[j]:net_offsets[j + 1]].
+    Components and nets are numbered from 0; component_ids, component_names,
+    net_ids and net_names map the numbers back to the database rows.
+
+    Two components are one hop apart when they share a logical net, so a
+    net with many pins (e.g. GND) costs one row per pin instead of one
+    edge per pair of components.
+    """
+
+    def __init__(self, uid, revision, components, nets, connections):
+        self.uid = uid
+        self.revision = revision
+        self.component_ids = array('i', (component_id for component_id, _ in components))
+        self.component_names = [name for _, name in components]
+        self.net_ids = array('i', (net_id for net_id, _ in nets))
+        self.net_names = [name for _, name in nets]
+        self._component_number = {component_id: i for i, component_id in enumerate(self.component_ids)}
+        self._net_number = {net_id: j for j, net_id in enumerate(self.net_ids)}
+
+        pairs = [
+            (self._component_number[component_id], self._net_number[net_id])
+            for component_id, net_id in connections
+            if component_id in self._component_number and net_id in self._net_number
+        ]
+        self.component_offsets, self.net_index = self._csr(len(self.component_ids), pairs)
+        self.net_offsets, self.component_index = self._csr(len(self.net_ids), [(j, i) for i, j in pairs])
+
+    @staticmethod
+    def _csr(size, pairs):
+        offsets = array('i', [0] * (size + 1))
+        for source, _ in pairs:
+            offsets[source + 1] += 1
+        for i in range(size):
+            offsets[i + 1] += offsets[i]
+        targets = array('i', [0] * len(pairs))
+        position = array('i', offsets[:size])
+        for source, target in pairs:
+            targets[position[source]] = target
+            position[source] += 1
+        return offsets, targets
+
+    def component_number(self, component_id):
+        return self._component_number.get(component_id)
+
+    def nets_of(self, i):
+        return self.net_index[self.component_offsets[i]:self.component_offsets[i + 1]]
+
+    def components_of(self, j):
+        return self.component_index[self.net_offsets[j]:self.net_offsets[j + 1]]
+
+    def _skipped_nets(self, exclude_nets):
+        exclude_nets = {name.upper() for name in exclude_nets or ()}
+        return {j for j, name in enumerate(self.net_names) if name.upper() in exclude_nets}
+
+    def connected(self, i, exclude_nets=None):
+        """
+        Return {component number: [net numbers shared with i]} for every
+        component one hop away from i.
+        """
+        skipped = self._skipped_nets(exclude_nets)
+        neighbours = {}
+        for j in self.nets_of(i):
+            if j in skipped:
+                continue
+            for k in self.components_of(j):
+                if k != i:
+                    neighbours.setdefault(k, []).append(j)
+        return neighbours
+
+    def _bfs(self, start, max_hops=None, target=None, exclude_nets=None):
+        skipped = self._skipped_nets(exclude_nets)
+        distance = {start: 0}
+        previous = {}  # component number -> (previous component, net)
+        visited_nets = set(skipped)
+        queue = deque([start])
+        while queue:
+            i = queue.popleft()
+            if i == target or (max_hops is not None and distance[i] >= max_hops):
+                continue
+            for j in self.nets_of(i):
+                if j in visited_nets:
+                    continue
+                visited_nets.add(j)
+                for k in self.components_of(j):
+                    if k not in distance:
+                        distance[k] = distance[i] + 1
+                        previous[k] = (i, j)
+                        queue.append(k)
+        return distance, previous
+
+    def within(self, i, hops, exclude_nets=None):
+        """
+        Return {component number: hops} for the components at most hops away from i.
+        """
+        distance, _ = self._bfs(i, max_hops=hops, exclude_nets=exclude_nets)
+        del distance[i]
+        return distance
+
+    def shortest_path(self, i, target, exclude_nets=None):
+        """
+        Return the shortest path from i to target as a list of
+        (component number, net number used to reach it) pairs, the first
+        net being None, or None when the components are not connected.
+        """
+        _, previous = self._bfs(i, target=target, exclude_nets=exclude_nets)
+        if target != i and target not in previous:
+            return None
+
+        path = []
+        node = target
+        while node != i:
+            previous_node, net = previous[node]
+            path.append((node, net))
+            node = previous_node
+        path.append((i, None))
+        path.reverse()
+        return path
+
+_graph_cache = OrderedDict()  # board_id -> NetlistGraph
+_graph_cache_lock = threading.Lock()
+
+def load_board_graph(connection, board_id, version):
+    components = connection.execute(
+        text("SELECT id, name FROM component WHERE board_id = :board_id ORDER BY id"), {"board_id": board_id}
+    ).all()
+    nets = connection.execute(
+        text("SELECT id, name FROM logical_net WHERE board_id = :board_id ORDER BY id"), {"board_id": board_id}
+    ).all()
+    connections = connection.execute(text(
+        "SELECT DISTINCT np.component_id, np.logical_net_id FROM net_pin np "
+        "JOIN logical_net ln ON np.logical_net_id = ln.id "
+        "WHERE ln.board_id = :board_id"
+    ), {"board_id": board_id}).all()
+    return NetlistGraph(*version, components, nets, connections)
+
+def get_board_graph(board_id):
+    """
+    Return the connectivity graph of a board, or None when the board does
+    not exist. Graphs are built lazily and rebuilt when the board's
+    revision changes, which every component, net and net pin mutation bumps,
+    or when its id now belongs to another board.
+    """
+    with engine.connect() as connection:
+        version = board_version(connection, board_id)
+        if version is None:
+            return None
+
+        with _graph_cache_lock:
+            graph = _graph_cache.get(board_id)
+            if graph is not None and (graph.uid, graph.revision) == version:
+                _graph_cache.move_to_end(board_id)
+                return graph
+
+        graph = load_board_graph(connection, board_id, version)
+
+    with _graph_cache_lock:
+        _graph_cache[board_id] = graph
+        _graph_cache.move_to_end(board_id)
+        while len(_graph_cache) > GRAPH_CACHE_SIZE:
+            _graph_cache.popitem(last=False)
+    return graph
+
+def get_component_graph(component_id):
+    """
+    Return (graph, component number) for a component, or (None, None) when
+    the component does not exist.
+    """
+    with engine.connect() as connection:
+        board_id = connection.execute(
+            text("SELECT board_id FROM component WHERE id = :component_id"), {"component_id": component_id}
+        ).scalar()
+    if board_id is None:
+        return None, None
+    graph = get_board_graph(board_id)
+    if graph is None:
+        return None, None
+    return graph, graph.component_number(component_id)
@@ -84,7 +84,7 @@ def parse_ipc2581_and_populate_db(file_path, session=None):
                         if point_type == 'PolyStepCurve':
                             center_x = float(point_elem.get('centerX', '0.0'))
                             center_y = float(point_elem.get('centerY', '0.0'))
-                            clockwise = point_elem.get('clockwise', 'FALSE') == 'TRUE'
+                            clockwise = point_elem.get('clockwise', 'false').lower() == 'true'
                             point_data.update({
                                 'centerX': center_x,
                                 'centerY': center_y,
@@ -161,7 +161,7 @@ def parse_ipc2581_and_populate_db(file_path, session=None):
                         if point_type == 'PolyStepCurve':
                             center_x = float(point_elem.get('centerX', '0.0'))
                             center_y = float(point_elem.get('centerY', '0.0'))
-                            clockwise = point_elem.get('clockwise', 'FALSE') == 'TRUE'
+                            clockwise = point_elem.get('clockwise', 'false').lower() == 'true'
                             point_data.update({
                                 'centerX': center_x,
                                 'centerY': center_y,
@@ -440,7 +440,7 @@ def parse_ipc2581_and_populate_db(file_path, session=None):
                                 if point_type == 'PolyStepCurve':
                                     center_x = float(point_elem.get('centerX', '0.0'))
                                     center_y = float(point_elem.get('centerY', '0.0'))
-                                    clockwise = point_elem.get('clockwise', 'FALSE') == 'TRUE'
+                                    clockwise = point_elem.get('clockwise', 'false').lower() == 'true'
                                     point_data.update({
                                         'centerX': center_x,
                                         'centerY': center_y,
@@ -1,10 +1,17 @@
 import base64
-from flask import Flask, request, jsonify, g
+import json
+from flask import Flask, Response, request, jsonify, g, make_response, send_file
+from functools import wraps
 import database_ipc
 from database_ipc import Session
+import netlist_graph
+import board_geometry
+import board_snapshot
+import board_mesh
 import os
 import logging
-from voice_assistant_for_server import process_query, process_wav_file
+import threading
+from voice_assistant_for_server import process_query, process_query_stream, process_wav_file, invalidate_answer_cache, get_answer_cache_stats
 
 if os.environ.get('FLASK_ENV') != 'development':
     log = logging.getLogger('werkzeug')
@@ -15,6 +22,9 @@ from read_IPC import parse_ipc2581_and_populate_db
 import sys
 
 app = Flask(__name__)
+
+# Listening port, overridden by start_all.py when running several replicas
+PORT = int(os.environ.get('PORT', 5001))
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'cvg', 'txt', 'png', 'jpg', 'jpeg', 'gif', 'pdf'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
@@ -23,11 +33,43 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 database_ipc.init_db()
 
+# Max age (seconds) the gateway may cache read-mostly GET responses for
+CACHE_MAX_AGE = 300
+
+# Mark a GET endpoint as cacheable by the gateway through Cache-Control.
+# X-Board-Id names the board the response depends on (the board_id of the
+# URL, or the one given to cache_board), so that the gateway drops it only
+# when that board changes; responses without it are dropped on every write
+def cacheable(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        response = make_response(f(*args, **kwargs))
+        if response.status_code == 200:
+            response.headers['Cache-Control'] = f'public, s-maxage={CACHE_MAX_AGE}'
+            board_id = g.get('cache_board_id', kwargs.get('board_id'))
+            if board_id is not None:
+                response.headers['X-Board-Id'] = str(board_id)
+        return response
+    return decorated_function
+
+# Name the board a cacheable response depends on when it is not in the URL
+def cache_board(board_id):
+    g.cache_board_id = board_id
+
 # Middleware to create and close database session for each request
 @app.before_request
 def create_session():
     g.session = Session()
 
+# Report the boards changed by a write, see database_ipc.board_changed. Writes
+# without the header may have changed anything and clear the gateway's cache
+@app.after_request
+def report_changed_boards(response):
+    session = g.get('session')
+    if request.method != 'GET' and session is not None and "changed_boards" in session.info:
+        response.headers['X-Changed-Boards'] = ','.join(str(board_id) for board_id in sorted(session.info["changed_boards"]))
+    return response
+
 # Ensure the session is available in the global context
 @app.teardown_appcontext
 def close_session(exception=None):
@@ -52,6 +94,7 @@ def get_boards():
 
 # return a specific board by id (name and polygon)
 @app.route('/api/boards/<int:board_id>', methods=['GET'])
+@cacheable
 def get_board(board_id):
     board = database_ipc.get_board(g.session, board_id)
     if not board:
@@ -119,12 +162,26 @@ def delete_board(board_id):
         if not success:
             return jsonify({"error": message}), 400 if "Cannot delete board" in message else 404
 
+        board_snapshot.discard_snapshots(board_id)
         return jsonify({"message": message})
     except Exception as e:
         g.session.rollback()
         return jsonify({"error": str(e)}), 500
 
-# Deep Delete Board by id (board and all its dependencies)
+# Run the vacuum requested with ?vacuum=full|incremental, after a committed
+# delete. The delete stands even if the vacuum fails (e.g. the database is
+# busy), so the error is only logged
+def vacuum_after_delete():
+    mode = request.args.get('vacuum')
+    if mode in ('full', 'incremental'):
+        g.session.close()
+        try:
+            database_ipc.vacuum_database(incremental=(mode == 'incremental'))
+        except Exception as e:
+            print(f"Error during {mode} vacuum: {e}")
+
+# Deep Delete Board by id (board and all its dependencies),
+# ?vacuum=full|incremental reclaims the freed space afterwards
 @app.route('/api/boards/<int:board_id>/deep-delete', methods=['DELETE'])
 def deep_delete_board_api(board_id):
 
@@ -133,6 +190,9 @@ def deep_delete_board_api(board_id):
         
         if not success:
             return jsonify({"error": message}), 404 if "not found" in message else 500
+
+        board_snapshot.discard_snapshots(board_id)
+        vacuum_after_delete()
         
         return jsonify({
             "message": message,
@@ -145,6 +205,105 @@ def deep_delete_board_api(board_id):
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
 
+# return the world-space position of every pin of a board as parallel arrays
+# (component_ids, pin_ids and xy flattened as x0, y0, x1, y1, ...);
+# ?format=binary returns little-endian records of (int32 component_id,
+# int32 pin_id, float32 x, float32 y) instead
+@app.route('/api/boards/<int:board_id>/pin_positions', methods=['GET'])
+@cacheable
+def get_board_pin_positions(board_id):
+    board_pins = board_geometry.get_board_pins(board_id)
+    if board_pins is None:
+        return jsonify({"error": "Board not found"}), 404
+
+    if request.args.get('format') == 'binary':
+        response = Response(board_pins.to_bytes(), mimetype='application/octet-stream', headers={
+            'X-Board-Revision': str(board_pins.revision),
+            'X-Pin-Count': str(len(board_pins))
+        })
+    else:
+        response = jsonify({
+            "board_id": board_id,
+            "revision": board_pins.revision,
+            "component_ids": board_pins.component_ids.tolist(),
+            "pin_ids": board_pins.pin_ids.tolist(),
+            "xy": board_pins.xy.round(6).ravel().tolist()
+        })
+    response.set_etag(
+        f"pins-{board_id}-{board_pins.uid}-r{board_pins.revision}"
+        f"-p{board_geometry.PLACEMENT_VERSION}-{request.args.get('format', 'json')}"
+    )
+    return response.make_conditional(request)
+
+
+# return the whole board (polygon, layers, packages, pins, components, nets,
+# net pins and net designs) as one binary snapshot, see board_snapshot for
+# the format. Snapshots are built once per board revision and kept on disk
+@app.route('/api/boards/<int:board_id>/snapshot', methods=['GET'])
+@cacheable
+def get_board_snapshot(board_id):
+    try:
+        snapshot = board_snapshot.get_snapshot(board_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if snapshot is None:
+        return jsonify({"error": "Board not found"}), 404
+
+    (uid, revision), path = snapshot
+    response = send_file(
+        os.path.abspath(path),
+        mimetype='application/octet-stream',
+        download_name=f"board_{board_id}.arbs",
+        etag=board_snapshot.snapshot_etag(board_id, (uid, revision)),
+        last_modified=None
+    )
+    response.headers['X-Board-Revision'] = str(revision)
+    response.headers['X-Snapshot-Version'] = str(board_snapshot.SNAPSHOT_VERSION)
+    return response
+
+
+# return the triangle meshes of a board (outline, net designs of each layer,
+# component footprints of each side) as vertex and index buffers ready for
+# the GPU, see board_mesh for the format. Built once per board revision
+@app.route('/api/boards/<int:board_id>/mesh', methods=['GET'])
+@cacheable
+def get_board_mesh(board_id):
+    try:
+        mesh = board_mesh.get_board_mesh(board_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if mesh is None:
+        return jsonify({"error": "Board not found"}), 404
+
+    (uid, revision), data = mesh
+    response = Response(data, mimetype='application/octet-stream', headers={
+        'X-Board-Revision': str(revision),
+        'X-Mesh-Version': str(board_mesh.MESH_VERSION)
+    })
+    response.set_etag(f"mesh-{board_id}-{uid}-r{revision}-v{board_mesh.MESH_VERSION}-p{board_geometry.PLACEMENT_VERSION}")
+    return response.make_conditional(request)
+
+# return the rows of a board inserted, updated or deleted since revision
+# ?since=N of the board ?uid=U (the "uid" of the last response). With
+# "full": true the change log no longer covers that gap, or the id now
+# belongs to another board, and the client should reload the board from
+# /api/boards/<id>/snapshot
+@app.route('/api/boards/<int:board_id>/changes', methods=['GET'])
+def get_board_changes(board_id):
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({"error": "since must be a board revision"}), 400
+
+    try:
+        changes = database_ipc.get_board_changes(g.session, board_id, since, request.args.get('uid'))
+    except Exception as e:
+        g.session.rollback()
+        return jsonify({"error": str(e)}), 500
+    if changes is None:
+        return jsonify({"error": "Board not found"}), 404
+    return jsonify(changes)
+
+
 ################################################################
 # API for Package
 ################################################################
@@ -406,6 +565,7 @@ def get_components_by_board(board_id):
 
 # return a list of all components by board_id, include package and pin details
 @app.route('/api/components/<int:board_id>/details', methods=['GET'])
+@cacheable
 def get_components_details_by_board(board_id):
     components = database_ipc.get_components_by_board(g.session, board_id)
     result = []
@@ -444,10 +604,12 @@ def get_components_details_by_board(board_id):
 
 # return a specific component by id and include package and pin details
 @app.route('/api/component/<int:component_id>/details', methods=['GET'])
+@cacheable
 def get_component_details(component_id):
     component = database_ipc.get_component(g.session, component_id)
     if not component:
         return jsonify({"error": "Component not found"}), 404
+    cache_board(component.board_id)
 
     package = database_ipc.get_package(g.session, component.package_id)
     if not package:
@@ -597,6 +759,7 @@ def get_logical_net(logical_net_id):
 
 # return a list of all logical_nets for a specific board (id, name)
 @app.route('/api/logical_nets/<int:board_id>', methods=['GET'])
+@cacheable
 def get_logical_nets_by_board(board_id):
     logical_nets = database_ipc.get_logical_nets_by_board(g.session, board_id)
     return jsonify([{
@@ -734,6 +897,82 @@ def get_component_pin_nets(component_id):
         "logical_net_id": net_pin.logical_net_id
     } for net_pin in net_pins])
 
+# Connectivity queries on the board's netlist graph. Components are one hop
+# apart when they share a logical net; ?exclude_nets=GND,VCC ignores the
+# listed nets (e.g. power rails that connect almost everything)
+
+MAX_GRAPH_HOPS = 10
+
+def _excluded_nets():
+    return [name.strip() for name in request.args.get('exclude_nets', '').split(',') if name.strip()]
+
+def _graph_component(graph, i):
+    return {"component_id": graph.component_ids[i], "name": graph.component_names[i]}
+
+# return the components sharing a logical net with a component, with the shared nets
+@app.route('/api/component/<int:component_id>/connected', methods=['GET'])
+@cacheable
+def get_connected_components(component_id):
+    graph, i = netlist_graph.get_component_graph(component_id)
+    if graph is None or i is None:
+        return jsonify({"error": "Component not found"}), 404
+
+    connected = graph.connected(i, _excluded_nets())
+    return jsonify({
+        **_graph_component(graph, i),
+        "connected": [{
+            **_graph_component(graph, k),
+            "nets": [graph.net_names[j] for j in nets]
+        } for k, nets in sorted(connected.items(), key=lambda item: graph.component_names[item[0]])]
+    })
+
+# return the components at most ?hops=N (default 1) hops away from a component
+@app.route('/api/component/<int:component_id>/neighborhood', methods=['GET'])
+@cacheable
+def get_component_neighborhood(component_id):
+    hops = request.args.get('hops', 1, type=int)
+    if hops is None or not 1 <= hops <= MAX_GRAPH_HOPS:
+        return jsonify({"error": f"hops must be between 1 and {MAX_GRAPH_HOPS}"}), 400
+
+    graph, i = netlist_graph.get_component_graph(component_id)
+    if graph is None or i is None:
+        return jsonify({"error": "Component not found"}), 404
+
+    distances = graph.within(i, hops, _excluded_nets())
+    return jsonify({
+        **_graph_component(graph, i),
+        "hops": hops,
+        "components": [{
+            **_graph_component(graph, k),
+            "hops": distance
+        } for k, distance in sorted(distances.items(), key=lambda item: (item[1], graph.component_names[item[0]]))]
+    })
+
+# return the shortest connection between two components of the same board
+@app.route('/api/component/<int:component_id>/path/<int:target_component_id>', methods=['GET'])
+@cacheable
+def get_component_path(component_id, target_component_id):
+    graph, i = netlist_graph.get_component_graph(component_id)
+    if graph is None or i is None:
+        return jsonify({"error": "Component not found"}), 404
+    target = graph.component_number(target_component_id)
+    if target is None:
+        return jsonify({"error": "Target component not found on the same board"}), 404
+
+    path = graph.shortest_path(i, target, _excluded_nets())
+    if path is None:
+        return jsonify({"error": "The components are not connected"}), 404
+
+    return jsonify({
+        "from": _graph_component(graph, i),
+        "to": _graph_component(graph, target),
+        "hops": len(path) - 1,
+        "path": [{
+            **_graph_component(graph, k),
+            "via_net": graph.net_names[j] if j is not None else None
+        } for k, j in path]
+    })
+
 # create a new net pin with component_id, pin_id and logical_net_id
 @app.route('/api/net_pins', methods=['POST'])
 def create_net_pin():
@@ -807,6 +1046,7 @@ def delete_net_pin(net_pin_id):
 
 # return a list of all layers for a specific board (id, name, layer_type, stack_order)
 @app.route('/api/layers/<int:board_id>', methods=['GET'])
+@cacheable
 def get_layers_by_board_api(board_id):
     layers = database_ipc.get_layers_by_board(g.session, board_id)
     return jsonify([{
@@ -919,50 +1159,138 @@ def delete_layer_api(layer_id):
 # API for NetDesign
 ################################################################
 
+# Net design endpoints return the level of detail picked with ?lod=N:
+# 0 (the default) is the original geometry, higher levels are coarser
+# (see geometry_lod.LOD_TOLERANCES)
+def _requested_lod():
+    lod = request.args.get('lod', 0, type=int)
+    if lod != 0 and lod not in database_ipc.LOD_TOLERANCES:
+        return None
+    return lod
+
+def _lod_error():
+    return jsonify({"error": f"lod must be between 0 and {max(database_ipc.LOD_TOLERANCES)}"}), 400
+
 # return a list of all net designs for a specific logical net (id, layer_id, geometry_json)
 @app.route('/api/logical_nets/<int:logical_net_id>/net_designs', methods=['GET'])
+@cacheable
 def get_net_designs_by_logical_net_api(logical_net_id):
+    lod = _requested_lod()
+    if lod is None:
+        return _lod_error()
     net_designs = database_ipc.get_net_designs_by_logical_net(g.session, logical_net_id)
+    geometries = database_ipc.get_net_design_geometries(g.session, net_designs, lod)
     return jsonify([{
         "id": design.id,
         "layer_id": design.layer_id,
         "layer_name": design.layer.name if design.layer else None,
-        "geometry_json": design.geometry_json
+        "lod": lod,
+        "geometry_json": geometries[design.id]
     } for design in net_designs])
 
+# return everything needed to highlight a logical net in one request: the
+# connected components with the world-space position of the pins on the net
+# and the net's geometry grouped by layer. The ETag follows the board's
+# identity and revision, so clients can revalidate with If-None-Match
+@app.route('/api/logical_nets/<int:logical_net_id>/highlight', methods=['GET'])
+@cacheable
+def get_logical_net_highlight(logical_net_id):
+    highlight = database_ipc.get_net_highlight(g.session, logical_net_id)
+    if highlight is None:
+        return jsonify({"error": "Logical net not found"}), 404
+    net, pins, designs = highlight
+    cache_board(net.board_id)
+
+    components = {}
+    for row in pins:
+        component = components.get(row.component_id)
+        if component is None:
+            component = components[row.component_id] = {
+                "id": row.component_id,
+                "name": row.component_name,
+                "part": row.part,
+                "layer": row.layer,
+                "rotation": row.rotation,
+                "x": row.x,
+                "y": row.y,
+                "pins": []
+            }
+        x, y = board_geometry.pin_world_position(row.x, row.y, row.rotation, row.layer, row.pin_x, row.pin_y)
+        component["pins"].append({"id": row.pin_id, "name": row.pin_name, "x": x, "y": y})
+
+    layers = {}
+    for row in designs:
+        layer = layers.get(row.layer_id)
+        if layer is None:
+            layer = layers[row.layer_id] = {
+                "layer_id": row.layer_id,
+                "layer_name": row.layer_name,
+                "side": row.side,
+                "net_designs": []
+            }
+        layer["net_designs"].append({"id": row.id, "geometry_json": row.geometry_json})
+
+    response = jsonify({
+        "id": net.id,
+        "name": net.name,
+        "board_id": net.board_id,
+        "revision": net.revision,
+        "components": list(components.values()),
+        "layers": list(layers.values())
+    })
+    response.set_etag(f"net-{net.id}-{net.uid}-r{net.revision}-p{board_geometry.PLACEMENT_VERSION}")
+    return response.make_conditional(request)
+
 # return a list of all net designs for a specific layer (id, logical_net_id, geometry_json)
 @app.route('/api/layers/<int:layer_id>/net_designs', methods=['GET'])
+@cacheable
 def get_net_designs_by_layer_api(layer_id):
+    lod = _requested_lod()
+    if lod is None:
+        return _lod_error()
     net_designs = database_ipc.get_net_designs_by_layer(g.session, layer_id)
+    geometries = database_ipc.get_net_design_geometries(g.session, net_designs, lod)
     return jsonify([{
         "id": design.id,
         "logical_net_id": design.logical_net_id,
         "logical_net_name": design.logical_net.name if design.logical_net else None,
-        "geometry_json": design.geometry_json
+        "lod": lod,
+        "geometry_json": geometries[design.id]
     } for design in net_designs])
 
 # return a specific net design by id (logical_net_id, layer_id, geometry_json)
 @app.route('/api/net_design/<int:net_design_id>', methods=['GET'])
 def get_net_design_api(net_design_id):
+    lod = _requested_lod()
+    if lod is None:
+        return _lod_error()
     net_design = database_ipc.get_net_design(g.session, net_design_id)
     if not net_design:
         return jsonify({"error": "Net design not found"}), 404
 
+    geometries = database_ipc.get_net_design_geometries(g.session, [net_design], lod)
     return jsonify({
         "logical_net_id": net_design.logical_net_id,
         "logical_net_name": net_design.logical_net.name if net_design.logical_net else None,
         "layer_id": net_design.layer_id,
         "layer_name": net_design.layer.name if net_design.layer else None,
-        "geometry_json": net_design.geometry_json
+        "lod": lod,
+        "geometry_json": geometries[net_design_id]
     })
 
 # return net designs for a specific logical net and layer
 @app.route('/api/logical_nets/<int:logical_net_id>/layers/<int:layer_id>/net_designs', methods=['GET'])
+@cacheable
 def get_net_designs_by_logical_net_and_layer_api(logical_net_id, layer_id):
+    lod = _requested_lod()
+    if lod is None:
+        return _lod_error()
     net_designs = database_ipc.get_net_designs_by_logical_net_and_layer(g.session, logical_net_id, layer_id)
+    geometries = database_ipc.get_net_design_geometries(g.session, net_designs, lod)
     return jsonify([{
         "id": design.id,
-        "geometry_json": design.geometry_json
+        "lod": lod,
+        "geometry_json": geometries[design.id]
     } for design in net_designs])
 
 # create a new net design with logical_net_id, layer_id and geometry_json
@@ -1079,6 +1407,7 @@ def create_info_txt():
         board_id = int(board_id)
         file_content = file.read()
         info_txt = database_ipc.create_info_txt(g.session, board_id, file_content)
+        invalidate_answer_cache(board_id)
 
         return jsonify({
             "id": info_txt.id,
@@ -1098,6 +1427,8 @@ def update_info_txt(info_txt_id):
         board_id = int(board_id) if board_id else None
         file_content = file.read() if file else None
 
+        previous = database_ipc.get_info_txt(g.session, info_txt_id)
+        previous_board_id = previous.board_id if previous else None
         success = database_ipc.update_info_txt(
             g.session,
             info_txt_id,
@@ -1109,6 +1440,8 @@ def update_info_txt(info_txt_id):
             return jsonify({"error": "Info text not found"}), 404
 
         info_txt = database_ipc.get_info_txt(g.session, info_txt_id)
+        invalidate_answer_cache(previous_board_id)
+        invalidate_answer_cache(info_txt.board_id)
         return jsonify({
             "id": info_txt.id,
             "board_id": info_txt.board_id
@@ -1121,10 +1454,13 @@ def update_info_txt(info_txt_id):
 @app.route('/api/info_txt/<int:info_txt_id>', methods=['DELETE'])
 def delete_info_txt(info_txt_id):
     try:
+        info_txt = database_ipc.get_info_txt(g.session, info_txt_id)
+        board_id = info_txt.board_id if info_txt else None
         success = database_ipc.delete_info_txt(g.session, info_txt_id)
         if not success:
             return jsonify({"error": "Info text not found"}), 404
 
+        invalidate_answer_cache(board_id)
         return jsonify({"message": "Info text deleted successfully"})
     except Exception as e:
         g.session.rollback()
@@ -1279,6 +1615,7 @@ def create_user_manual():
         board_id = int(board_id)
         file_content = file.read()
         user_manual = database_ipc.create_user_manual(g.session, board_id, file_content)
+        invalidate_answer_cache(board_id)
 
         return jsonify({
             "id": user_manual.id,
@@ -1298,6 +1635,8 @@ def update_user_manual(user_manual_id):
         board_id = int(board_id) if board_id else None
         file_content = file.read() if file else None
 
+        previous = database_ipc.get_user_manual(g.session, user_manual_id)
+        previous_board_id = previous.board_id if previous else None
         success = database_ipc.update_user_manual(
             g.session,
             user_manual_id,
@@ -1309,6 +1648,8 @@ def update_user_manual(user_manual_id):
             return jsonify({"error": "User manual not found"}), 404
 
         user_manual = database_ipc.get_user_manual(g.session, user_manual_id)
+        invalidate_answer_cache(previous_board_id)
+        invalidate_answer_cache(user_manual.board_id)
         return jsonify({
             "id": user_manual.id,
             "board_id": user_manual.board_id
@@ -1321,10 +1662,13 @@ def update_user_manual(user_manual_id):
 @app.route('/api/user_manual/<int:user_manual_id>', methods=['DELETE'])
 def delete_user_manual(user_manual_id):
     try:
+        user_manual = database_ipc.get_user_manual(g.session, user_manual_id)
+        board_id = user_manual.board_id if user_manual else None
         success = database_ipc.delete_user_manual(g.session, user_manual_id)
         if not success:
             return jsonify({"error": "User manual not found"}), 404
 
+        invalidate_answer_cache(board_id)
         return jsonify({"message": "User manual deleted successfully"})
     except Exception as e:
         g.session.rollback()
@@ -1343,6 +1687,7 @@ def voice_assistance_route(board_id):
     wav_file = request.files['file']
     if not wav_file.filename.lower().endswith('.wav'):
         return jsonify({"error": "The file must be a WAV"}), 400
+    database_ipc.refresh_assistant_context(g.session, board_id)
     result = process_wav_file(wav_file, board_id)
     return jsonify(result)
 
@@ -1362,6 +1707,8 @@ def text_assistance_route(board_id):
 
     print(f"Processing text: {text_content}")
 
+    database_ipc.refresh_assistant_context(g.session, board_id)
+
     result = process_query(text_content, board_id)
 
     if isinstance(result, dict):
@@ -1369,42 +1716,114 @@ def text_assistance_route(board_id):
     else:
         return jsonify({"error": "Unexpected response format from process_query.", "query": text_content, "components": []})
 
-# Generate LLM data for a specific board
+# Text Assistance Route streaming the answer as server-sent events
+@app.route('/api/text-assistance/<int:board_id>/stream', methods=['POST'])
+def text_assistance_stream_route(board_id):
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "No JSON data provided"}), 400
+
+    text_content = data.get('text', '').strip()
+    if not text_content:
+        return jsonify({"error": "No text provided"}), 400
+
+    print(f"Streaming text: {text_content}")
+
+    database_ipc.refresh_assistant_context(g.session, board_id)
+
+    def events():
+        for event, payload in process_query_stream(text_content, board_id):
+            yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+# Answer cache counters for the assistant routes
+@app.route('/api/assistant/cache', methods=['GET'])
+def assistant_cache_stats():
+    return jsonify(get_answer_cache_stats())
+
+# Background generations of LLM data, by board id (this process only)
+def _llm_data_response(session, board_id, results):
+    info_txts = database_ipc.get_info_txt_by_board(session, board_id)
+    board = database_ipc.get_board(session, board_id)
+    return {
+        "message": "LLM data generated successfully",
+        "board_id": board_id,
+        "revision": board.revision,
+        "artifacts": results,
+        "info_txt_count": len(info_txts),
+        "info_txt_ids": [info.id for info in info_txts]
+    }
+
+# Background generation; its status is kept in the database so that every
+# replica can answer the status requests
+def _run_llm_data_job(board_id, force):
+    session = Session()
+    try:
+        try:
+            results = database_ipc.generate_llm_data(session, board_id, force)
+            invalidate_answer_cache(board_id)
+            status, result = "done", _llm_data_response(session, board_id, results)
+        except Exception as e:
+            session.rollback()
+            status, result = "failed", {"error": str(e)}
+        database_ipc.finish_llm_data_job(session, board_id, status, result)
+    except Exception as e:
+        session.rollback()
+        print(f"Error recording LLM data job: {str(e)}")
+    finally:
+        session.close()
+
+# Generate LLM data for a specific board: only the texts whose board data
+# changed since the last generation are rebuilt (?force=1 rebuilds all),
+# ?background=1 returns at once and runs the generation in a thread
 @app.route('/api/generate_llm_data/<int:board_id>', methods=['POST'])
 def generate_llm_data(board_id):
+    force = request.args.get('force', '0') == '1'
     try:
-        
         board = database_ipc.get_board(g.session, board_id)
         if not board:
             return jsonify({"error": f"Board with ID {board_id} not found"}), 404
 
-        database_ipc.generate_logical_net_text("arboard.db", board_id)
-        database_ipc.generate_component_list("arboard.db", board_id)
-
-        info_txts = database_ipc.get_info_txt_by_board(g.session, board_id)
+        if request.args.get('background', '0') == '1':
+            if database_ipc.start_llm_data_job(g.session, board_id):
+                threading.Thread(target=_run_llm_data_job, args=(board_id, force), daemon=True).start()
+            return jsonify(database_ipc.get_llm_data_job(g.session, board_id)), 202
 
-        return jsonify({
-            "message": "LLM data generated successfully",
-            "board_id": board_id,
-            "info_txt_count": len(info_txts),
-            "info_txt_ids": [info.id for info in info_txts]
-        }), 200
+        results = database_ipc.generate_llm_data(g.session, board_id, force)
+        invalidate_answer_cache(board_id)
+        return jsonify(_llm_data_response(g.session, board_id, results)), 200
 
     except Exception as e:
         g.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+# Status of the last background generation of LLM data for a board
+@app.route('/api/generate_llm_data/<int:board_id>', methods=['GET'])
+def get_llm_data_job(board_id):
+    job = database_ipc.get_llm_data_job(g.session, board_id)
+    if job is None:
+        return jsonify({"error": "No generation job for this board"}), 404
+    return jsonify(job)
 
 ################################################################
 # API for general operations
 ################################################################
 
-# Clear the entire database
+# Clear the entire database, ?vacuum=full|incremental reclaims the freed space afterwards
 @app.route('/api/clear-database', methods=['DELETE'])
 def clear_database():
     try:
         success = database_ipc.clear_all_database(g.session)
         if success:
+            board_snapshot.discard_snapshots()
+            vacuum_after_delete()
             return jsonify({"message": "Database cleared successfully"})
         else:
             return jsonify({"error": "Failed to clear database"}), 500
@@ -1440,9 +1859,18 @@ def upload_file():
 
     return jsonify({'error': 'File type not allowed'}), 400
 
+# Health check endpoint
+@app.route('/api/health', methods=['GET'])
+def health_check():
+    return jsonify({
+        "status": "healthy",
+        "service": "IPC Server",
+        "port": PORT
+    })
+
 ################################################################
 
 
 # Run the Flask application for server IPC
 if __name__ == '__main__':
-    app.run(host="127.0.0.1", port=5001, debug=False)
\ No newline at end of file
+    app.run(host="127.0.0.1", port=PORT, debug=False)
\ No newline at end of file
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import board_geometry
+
+# Pins of BOTTOM parts of People_Counter_Project.cvg, one per rotation:
+# (component x, y, rotation, layer, pin x, pin y, trace endpoint on the pin)
+PINS_ON_TRACES = [
+    ("ANT1 1", 279.455999, 124.560401, 0, "BOTTOM", -11.120001, 2.464999, (290.576, 127.0254)),
+    ("IC8 D2", 259.781599, 143.3354, 90, "BOTTOM", 0.2, -0.599999, (259.1816, 143.5354)),
+    ("IC3 B1", 284.5094, 153.636599, 90, "BOTTOM", -1.000001, 0.25, (284.7594, 152.636598)),
+    ("IC1 44", 288.037001, 137.992602, 180, "BOTTOM", 2.500005, 7.925001, (290.537006, 130.067601)),
+    ("IC4 2", 258.8384, 152.4762, 270, "BOTTOM", -0.725, 0.399999, (258.438401, 153.2012)),
+    ("C11 2", 256.9718, 143.256, 270, "BOTTOM", 0.459999, 0.0, (256.9718, 142.796001)),
+]
+
+@pytest.mark.parametrize("pin", PINS_ON_TRACES, ids=[pin[0] for pin in PINS_ON_TRACES])
+def test_pin_world_position_lands_on_trace_endpoint(pin):
+    _, x, y, rotation, layer, pin_x, pin_y, endpoint = pin
+    assert board_geometry.pin_world_position(x, y, rotation, layer, pin_x, pin_y) == pytest.approx(endpoint, abs=1e-4)
+
+def test_transform_pins_matches_pin_world_position():
+    offsets = np.array([(pin[1], pin[2]) for pin in PINS_ON_TRACES])
+    matrices = board_geometry.placement_matrices(
+        np.array([pin[3] for pin in PINS_ON_TRACES], dtype=np.float64),
+        np.array([board_geometry.is_mirrored(pin[4]) for pin in PINS_ON_TRACES])
+    )
+    local = np.array([(pin[5], pin[6]) for pin in PINS_ON_TRACES])
+    xy = board_geometry.transform_pins(offsets, matrices, np.arange(len(PINS_ON_TRACES)), local)
+    assert xy == pytest.approx(np.array([pin[7] for pin in PINS_ON_TRACES]), abs=1e-4)
+
+def test_top_parts_are_not_mirrored():
+    assert board_geometry.pin_world_position(10.0, 20.0, 90, "TOP", 1.0, 0.5) == pytest.approx((9.5, 21.0))
@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_ipc import chunk_text, split_long_line
+
+CONNECTIONS = [f"IC{i} at P{i % 48 + 1}" for i in range(120)]
+NET_LINE = "Logical net GND: " + ", ".join(CONNECTIONS)
+
+def test_long_net_line_is_split_between_connections():
+    pieces = split_long_line(NET_LINE, 200)
+
+    assert len(pieces) > 1
+    assert all(len(piece) <= 200 for piece in pieces)
+    assert all(piece.startswith("Logical net GND: ") for piece in pieces)
+    # Every connection is kept whole, in order
+    rejoined = [item for piece in pieces for item in piece[len("Logical net GND: "):].split(", ")]
+    assert rejoined == CONNECTIONS
+
+def test_long_sentence_is_split_between_words():
+    line = "Note: " + " ".join(f"word{i}" for i in range(100))
+    pieces = split_long_line(line, 100)
+
+    assert all(len(piece) <= 100 and piece.startswith("Note: ") for piece in pieces)
+    assert " ".join(piece[len("Note: "):] for piece in pieces) == line[len("Note: "):]
+
+def test_words_longer_than_a_chunk_are_cut():
+    pieces = split_long_line("x" * 250, 100)
+
+    assert pieces == ["x" * 100, "x" * 100, "x" * 50]
+
+def test_chunks_keep_the_net_of_long_lines():
+    chunks = chunk_text("Notes about the board.\n" + NET_LINE, 300)
+
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    assert all("Logical net GND: " in chunk for chunk in chunks[1:])
@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import voice_assistant_for_server as assistant
+
+BOARD_ID = 1
+COMPONENTS = [("R5", 10.0, 20.0), ("U1", 30.0, 40.0), ("C3", 50.0, 60.0)]
+
+@pytest.fixture
+def board(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with sqlite3.connect("arboard.db") as conn:
+        conn.execute("CREATE TABLE component (id INTEGER PRIMARY KEY, board_id INTEGER, name TEXT, x REAL, y REAL, layer TEXT, rotation REAL)")
+        conn.executemany(
+            "INSERT INTO component (board_id, name, x, y, layer, rotation) VALUES (?, ?, ?, ?, 'TOP', 0)",
+            [(BOARD_ID, name, x, y) for name, x, y in COMPONENTS]
+        )
+    trie = {}
+    names = {}
+    for name, _, _ in COMPONENTS:
+        names[name.upper()] = name
+        node = trie
+        for char in name.upper():
+            node = node.setdefault(char, {})
+        node[None] = name
+    monkeypatch.setattr(assistant, "load_refdes_index", lambda board_id: (trie, names, {}))
+
+@pytest.mark.parametrize("query, components", [
+    ("Where is R5?", ["R5"]),
+    ("highlight U1", ["U1"]),
+    ("Could you highlight U1 please", ["U1"]),
+    ("show me C3", ["C3"]),
+    ("Show me R5 and U1 on the board", ["R5", "U1"]),
+    ("find the component R5", ["R5"]),
+])
+def test_location_requests_are_answered_locally(board, query, components):
+    located = assistant.route_location_intent(query, BOARD_ID)
+    assert located is not None
+    assert located["components"] == components
+    assert [location["name"] for location in located["locations"]] == components
+
+@pytest.mark.parametrize("query", [
+    "find the resistor connected to R5",
+    "show me the nets of U1",
+    "show me what U1 does",
+    "find a replacement for C3",
+    "show the voltage on R5",
+    "where is R5 connected",
+    "what is U1",
+    "show me the board",
+])
+def test_other_questions_go_to_the_llm(board, query):
+    assert assistant.route_location_intent(query, BOARD_ID) is None
+
+def test_refdes_index_follows_renames(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    board_id = 1000  # not cached by other tests
+    with sqlite3.connect("arboard.db") as conn:
+        conn.execute("CREATE TABLE board (id INTEGER PRIMARY KEY, uid TEXT, revision INTEGER)")
+        conn.execute("CREATE TABLE component (id INTEGER PRIMARY KEY, board_id INTEGER, name TEXT, x REAL, y REAL, layer TEXT, rotation REAL)")
+        conn.execute("CREATE TABLE pin (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.execute("CREATE TABLE net_pin (id INTEGER PRIMARY KEY, component_id INTEGER, pin_id INTEGER)")
+        conn.execute("INSERT INTO board VALUES (?, 'a', 1)", (board_id,))
+        conn.execute("INSERT INTO component (board_id, name, x, y, layer, rotation) VALUES (?, 'R7', 1, 2, 'TOP', 0)", (board_id,))
+    assert assistant.route_location_intent("where is R7", board_id)["components"] == ["R7"]
+
+    # A rename keeps the component count and ids but bumps the revision
+    with sqlite3.connect("arboard.db") as conn:
+        conn.execute("UPDATE component SET name = 'R700'")
+        conn.execute("UPDATE board SET revision = 2")
+    assert assistant.route_location_intent("where is R700", board_id)["components"] == ["R700"]
+    assert assistant.route_location_intent("where is R7", board_id) is None
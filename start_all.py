@@ -1,8 +1,10 @@
 import subprocess
+import sys
 import time
 import signal
 import os
 import logging
+import requests
 
 os.environ['FLASK_ENV'] = 'production'
 if os.environ.get('FLASK_ENV') != 'development':
@@ -29,8 +31,192 @@ else:
     GEN_SERVER_COMMAND = ['./server_gen']
     GATEWAY_COMMAND = ['./gateway']
 
-def start_process(command):
-    process = subprocess.Popen(command)
+# Supervisor settings
+HEALTH_POLL_INTERVAL = 0.2      # seconds between readiness probes during startup
+READINESS_TIMEOUT = 60          # seconds a service has to become ready
+MONITOR_INTERVAL = 2            # seconds between liveness checks once running
+MAX_HEALTH_FAILURES = 3         # consecutive failed probes before a hung service is restarted
+RESTART_BACKOFF_INITIAL = 1     # seconds before the first restart attempt
+RESTART_BACKOFF_MAX = 30        # upper bound for the restart backoff
+STABLE_UPTIME = 60              # seconds of uptime after which the backoff is reset
+STOP_TIMEOUT = 10               # seconds a process has to exit before it is killed
+STARTUP_ATTEMPTS = 3            # starts of a service that never becomes ready before giving up
+
+# Replicas per backend: the first keeps the historical port, the others listen
+# on consecutive ports starting from replica_port_base
+IPC_SERVER_REPLICAS = int(os.environ.get('IPC_SERVER_REPLICAS', 1))
+CROP_SERVER_REPLICAS = int(os.environ.get('CROP_SERVER_REPLICAS', 1))
+GEN_SERVER_REPLICAS = int(os.environ.get('GEN_SERVER_REPLICAS', 1))
+
+BACKENDS = [
+    {"name": "IPC Server", "command": IPC_SERVER_COMMAND, "port": 5001, "replica_port_base": 5101,
+     "replicas": IPC_SERVER_REPLICAS, "urls_env": "IPC_SERVER_URLS"},
+    {"name": "Crop Server", "command": CROP_SERVER_COMMAND, "port": 5002, "replica_port_base": 5201,
+     "replicas": CROP_SERVER_REPLICAS, "urls_env": "CROP_SERVER_URLS"},
+    {"name": "Gen Server", "command": GEN_SERVER_COMMAND, "port": 5003, "replica_port_base": 5301,
+     "replicas": GEN_SERVER_REPLICAS, "urls_env": "GEN_SERVER_URLS"},
+]
+
+def replica_ports(backend):
+    extra = max(backend["replicas"], 1) - 1
+    return [backend["port"]] + [backend["replica_port_base"] + i for i in range(extra)]
+
+SERVICES = [
+    {
+        "name": backend["name"] if index == 0 else f"{backend['name']} #{index + 1}",
+        "command": backend["command"],
+        "port": port,
+        "health_path": "/api/health",
+        "env": {"PORT": str(port)},
+        "primary": index == 0,
+    }
+    for backend in BACKENDS
+    for index, port in enumerate(replica_ports(backend))
+]
+
+# The gateway learns the replica URLs of each backend from its environment
+GATEWAY_SERVICE = {
+    "name": "Gateway",
+    "command": GATEWAY_COMMAND,
+    "port": 5000,
+    "health_path": "/",
+    "env": {
+        backend["urls_env"]: ",".join(f"http://localhost:{port}" for port in replica_ports(backend))
+        for backend in BACKENDS
+    },
+}
+
+def health_url(service):
+    return f"http://localhost:{service['port']}{service['health_path']}"
+
+def is_healthy(service, timeout=1):
+    try:
+        response = requests.get(health_url(service), timeout=timeout)
+        return response.status_code == 200
+    except requests.exceptions.RequestException:
+        return False
+
+def wait_until_ready(services, timeout=READINESS_TIMEOUT):
+    """
+    Poll the health endpoint of every service until all of them answer,
+    returning as soon as the last one is ready. Returns the services that
+    exited or did not become ready in time (empty when all are ready).
+    """
+    pending = list(services)
+    failed = []
+    deadline = time.monotonic() + timeout
+
+    while pending and time.monotonic() < deadline:
+        for service in list(pending):
+            if service["process"].poll() is not None:
+                print(f"{service['name']} exited during startup (code {service['process'].returncode})")
+                pending.remove(service)
+                failed.append(service)
+            elif is_healthy(service):
+                print(f"{service['name']} ready on port {service['port']}")
+                pending.remove(service)
+        if pending:
+            time.sleep(HEALTH_POLL_INTERVAL)
+
+    for service in pending:
+        print(f"{service['name']} not ready after {timeout}s")
+    return pending + failed
+
+def start_service(service):
+    service["process"] = start_process(service["command"], service.get("env"))
+    service["started_at"] = time.monotonic()
+    service["health_failures"] = 0
+    service["restart_at"] = None
+    # Until it answers its health check the service is still starting
+    service["ready_by"] = service["started_at"] + READINESS_TIMEOUT
+
+def start_group(services):
+    """
+    Start services and wait until they are ready, starting again those
+    that are not, up to STARTUP_ATTEMPTS times. Returns True when all of
+    them are ready.
+    """
+    for service in services:
+        start_service(service)
+        print(f"{service['name']} starting on port {service['port']}")
+
+    for attempt in range(1, STARTUP_ATTEMPTS + 1):
+        not_ready = wait_until_ready(services)
+        for service in services:
+            if service not in not_ready:
+                service["ready_by"] = None
+        if not not_ready:
+            return True
+        if attempt == STARTUP_ATTEMPTS:
+            break
+
+        print(f"Starting again: {', '.join(service['name'] for service in not_ready)} (attempt {attempt + 1})")
+        for service in not_ready:
+            stop_process(service["process"])
+            start_service(service)
+        services = not_ready
+    return False
+
+def schedule_restart(service):
+    """
+    Plan a restart after the current backoff. The monitor loop starts the
+    service once the time has come, so it never waits on a single service.
+    """
+    backoff = service.get("backoff", RESTART_BACKOFF_INITIAL)
+    print(f"Restarting {service['name']} in {backoff}s...")
+    service["restart_at"] = time.monotonic() + backoff
+    service["backoff"] = min(backoff * 2, RESTART_BACKOFF_MAX)
+
+def supervise(services):
+    """
+    Keep every service alive: restart processes that exit, that stop
+    answering their health endpoint or that never become ready, with
+    exponential backoff.
+    """
+    while True:
+        time.sleep(MONITOR_INTERVAL)
+
+        for service in services:
+            now = time.monotonic()
+
+            if service.get("restart_at") is not None:
+                if now >= service["restart_at"]:
+                    start_service(service)
+                    print(f"{service['name']} restarted (pid {service['process'].pid})")
+                continue
+
+            process = service["process"]
+            if process.poll() is not None:
+                print(f"{service['name']} (pid {process.pid}) exited with code {process.returncode}")
+                schedule_restart(service)
+                continue
+
+            if service.get("ready_by") is not None:
+                if is_healthy(service):
+                    print(f"{service['name']} ready on port {service['port']}")
+                    service["ready_by"] = None
+                elif now > service["ready_by"]:
+                    print(f"{service['name']} not ready after {READINESS_TIMEOUT}s")
+                    stop_process(process)
+                    schedule_restart(service)
+                continue
+
+            if is_healthy(service):
+                service["health_failures"] = 0
+                if now - service["started_at"] > STABLE_UPTIME:
+                    service["backoff"] = RESTART_BACKOFF_INITIAL
+                continue
+
+            service["health_failures"] += 1
+            if service["health_failures"] >= MAX_HEALTH_FAILURES:
+                print(f"{service['name']} failed {service['health_failures']} health checks")
+                stop_process(process)
+                schedule_restart(service)
+
+def start_process(command, env=None):
+    if env:
+        env = {**os.environ, **env}
+    process = subprocess.Popen(command, env=env)
     return process
 
 def stop_process(process):
@@ -40,7 +226,12 @@ def stop_process(process):
                 process.terminate()
             else:
                 process.send_signal(signal.SIGINT)
-            process.wait()
+            try:
+                process.wait(timeout=STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                print(f"Process {process.pid} did not exit after {STOP_TIMEOUT}s, killing it")
+                process.kill()
+                process.wait(timeout=STOP_TIMEOUT)
             print(f"Process {process.pid} terminated.")
         except Exception as e:
             print(f"Error during process termination: {e}")
@@ -48,38 +239,36 @@ def stop_process(process):
 if __name__ == '__main__':
     print("Starting servers...")
 
-    # Start servers in order
-    ipc_server_process = start_process(IPC_SERVER_COMMAND)
-    print("IPC Server started on port 5001")
-
-    crop_server_process = start_process(CROP_SERVER_COMMAND)
-    print("Crop Server started on port 5002")
-
-    gen_server_process = start_process(GEN_SERVER_COMMAND)
-    print("Gen Server started on port 5003")
-
-    # Wait a bit before starting the gateway
-    time.sleep(2)
-
-    gateway_process = start_process(GATEWAY_COMMAND)
-    print("Gateway started on port 5000")
-
-    print("\nAll servers have been started!")
-    print("Gateway available on: http://localhost:5000")
-    print("- IPC API: http://localhost:5000/ipc/...")
-    print("- Crop API: http://localhost:5000/crop/...")
-    print("- Gen API: http://localhost:5000/gen/...")
-    print("\nHTTP request logs will appear below:")
-    print("-" * 50)
+    # Start all backends at once and wait until they answer their health checks.
+    # Primary replicas go first so that only one process per database runs init_db
+    primaries = [service for service in SERVICES if service["primary"]]
+    replicas = [service for service in SERVICES if not service["primary"]]
+    all_services = SERVICES + [GATEWAY_SERVICE]
+    exit_code = 0
 
     try:
-        gateway_process.wait()
+        for group in (primaries, replicas, [GATEWAY_SERVICE]):
+            if not start_group(group):
+                print("\nStartup failed: some servers never became ready.")
+                exit_code = 1
+                break
+        else:
+            print("\nAll servers have been started!")
+            print("Gateway available on: http://localhost:5000")
+            print("- IPC API: http://localhost:5000/ipc/...")
+            print("- Crop API: http://localhost:5000/crop/...")
+            print("- Gen API: http://localhost:5000/gen/...")
+            print("- Health: http://localhost:5000/health")
+            print("\nHTTP request logs will appear below:")
+            print("-" * 50)
+
+            supervise(all_services)
     except KeyboardInterrupt:
         print("\nKeyboard interrupt detected.")
     finally:
         print("Stopping servers...")
-        stop_process(gateway_process)
-        stop_process(gen_server_process)
-        stop_process(crop_server_process)
-        stop_process(ipc_server_process)
-        print("All servers have been stopped.")
\ No newline at end of file
+        for service in reversed(all_services):
+            stop_process(service.get("process"))
+        print("All servers have been stopped.")
+
+    sys.exit(exit_code)